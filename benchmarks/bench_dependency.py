@@ -0,0 +1,46 @@
+import json
+import pathlib
+import tempfile
+from dclab.core import dependency
+from benchmarks import common
+
+
+def write_node_state(filename, n_variables, n_files, n_parents):
+    dependencies = {
+        "state_variables": {"x{}".format(i): float(i) for i in range(n_variables)},
+        "static_files": ["template_{}.cmd".format(i) for i in range(n_files)],
+        "nodes": ["{:02d}_Node".format(i) for i in range(n_parents)],
+    }
+    with open(filename, "w") as f:
+        f.write(json.dumps({"dependencies": dependencies, "node_output": {}}))
+    return dependencies
+
+
+def run(sizes=(10, 100, 1000)):
+    results = list()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        for size in sizes:
+            # Identical states, so every part of the comparison is walked
+            dependencies = write_node_state(directory / "a.json", size, size, size)
+            write_node_state(directory / "b.json", size, size, size)
+            elapsed = common.time_function(
+                dependency.compare_node_states,
+                directory / "a.json",
+                directory / "b.json",
+            )
+            results.append(
+                {"name": "compare_node_states", "size": size, "time": elapsed}
+            )
+            parent_fingerprints = {x: "0" * 64 for x in dependencies["nodes"]}
+            elapsed = common.time_function(
+                dependency.fingerprint_dependencies, dependencies, parent_fingerprints
+            )
+            results.append(
+                {"name": "fingerprint_dependencies", "size": size, "time": elapsed}
+            )
+    return results
+
+
+if __name__ == "__main__":
+    print(common.results_to_string(run()))
@@ -0,0 +1,44 @@
+import pickle
+import pandas as pd
+from dclab.nodes.device.sentaurus import data_explorer
+from benchmarks import common, generators, legacy
+
+
+def run(
+    sizes=(1000, 10000, 100000), n_regions=20, n_parameters=30, compare_legacy=True
+):
+    results = list()
+    for size in sizes:
+        grd, dat = generators.generate_dfise(
+            size, n_regions=n_regions, n_parameters=n_parameters
+        )
+        elapsed = common.time_function(data_explorer.parse_dfise_str, grd, dat)
+        results.append({"name": "parse_dfise_str", "size": size, "time": elapsed})
+        # Compact region column against one dense column per region
+        for dense_regions in [False, True]:
+            frame = data_explorer.parse_dfise_str(grd, dat, dense_regions=dense_regions)
+            name = "dense" if dense_regions else "compact"
+            elapsed = common.time_function(pickle.dumps, frame)
+            results.append(
+                {"name": "pickle_" + name + "_regions", "size": size, "time": elapsed}
+            )
+            elapsed = common.time_function(
+                data_explorer.select_region, frame, "Region_1"
+            )
+            results.append(
+                {"name": "select_" + name + "_region", "size": size, "time": elapsed}
+            )
+        if compare_legacy:
+            elapsed = common.time_function(legacy.parse_dfise_str, grd, dat, repeat=1)
+            results.append(
+                {"name": "legacy_parse_dfise_str", "size": size, "time": elapsed}
+            )
+            # Both parsers must produce the same frame
+            new_frame = data_explorer.parse_dfise_str(grd, dat, dense_regions=True)
+            legacy_frame = legacy.parse_dfise_str(grd, dat)
+            pd.testing.assert_frame_equal(new_frame, legacy_frame[new_frame.columns])
+    return results
+
+
+if __name__ == "__main__":
+    print(common.results_to_string(run()))
@@ -0,0 +1,89 @@
+import os
+import pathlib
+import tempfile
+import pandas as pd
+from dclab.core import data
+from benchmarks import common, generators, legacy
+
+
+def load_memory(defaults_filename, doe_filename):
+    memory = data.SimulationMemory()
+    memory.load_defaults(defaults_filename)
+    memory.load_doe(doe_filename)
+    return memory
+
+
+def build_state(defaults_filename, doe_filename, directory):
+    # The state set up by the Simulation constructor, without run directories
+    memory = load_memory(defaults_filename, doe_filename)
+    memory.add_data_to_all_rows("fluxo", "0.0")
+    memory.add_data_to_all_rows("base_dir", str(directory))
+    folders = [str(directory) + os.sep + "run_" + str(i) for i in range(memory.size())]
+    memory.set_column("sim_dir", [x + os.sep for x in folders])
+    return memory
+
+
+def build_state_legacy(defaults_filename, doe_filename, directory):
+    memory = data.SimulationMemory()
+    memory.data_frame = legacy.merge_frames(
+        pd.read_csv(defaults_filename), pd.read_csv(doe_filename, index_col=False)
+    )
+    legacy.add_data_to_all_rows(memory, "fluxo", "0.0")
+    legacy.add_data_to_all_rows(memory, "base_dir", str(directory))
+    for i in range(memory.size()):
+        memory.add_data_at_index(
+            "sim_dir", str(directory) + os.sep + "run_" + str(i) + os.sep, index=i
+        )
+    return memory
+
+
+def read_all_rows(memory):
+    for i in range(memory.size()):
+        memory.get_row(i)
+
+
+def run(sizes=(100, 1000, 10000, 50000), compare_legacy=True):
+    results = list()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        defaults_filename = generators.generate_defaults(directory / "defaults.csv")
+        for size in sizes:
+            doe_filename = generators.generate_doe(directory / "doe.csv", size)
+            elapsed = common.time_function(load_memory, defaults_filename, doe_filename)
+            results.append({"name": "load_doe", "size": size, "time": elapsed})
+            memory = load_memory(defaults_filename, doe_filename)
+            elapsed = common.time_function(
+                memory.add_data_to_all_rows, "base_dir", str(directory), repeat=1
+            )
+            results.append(
+                {"name": "add_data_to_all_rows", "size": size, "time": elapsed}
+            )
+            elapsed = common.time_function(read_all_rows, memory, repeat=1)
+            results.append({"name": "get_row", "size": size, "time": elapsed})
+            elapsed = common.time_function(
+                build_state, defaults_filename, doe_filename, directory
+            )
+            results.append({"name": "build_state", "size": size, "time": elapsed})
+            if compare_legacy:
+                elapsed = common.time_function(
+                    build_state_legacy,
+                    defaults_filename,
+                    doe_filename,
+                    directory,
+                    repeat=1,
+                )
+                results.append(
+                    {"name": "legacy_build_state", "size": size, "time": elapsed}
+                )
+                # Both must produce the same state
+                pd.testing.assert_frame_equal(
+                    build_state(defaults_filename, doe_filename, directory).data_frame,
+                    build_state_legacy(
+                        defaults_filename, doe_filename, directory
+                    ).data_frame,
+                )
+    return results
+
+
+if __name__ == "__main__":
+    print(common.results_to_string(run()))
@@ -0,0 +1,34 @@
+import sys
+import pandas as pd
+from dclab.nodes.device.sentaurus import plt
+from benchmarks import common, generators, legacy
+
+
+def run(sizes=(1000, 10000, 100000, 1000000), compare_legacy=True):
+    results = list()
+    for size in sizes:
+        plt_content = generators.generate_plt(size)
+        elapsed = common.time_function(plt.plt_to_dataframe, plt_content)
+        results.append({"name": "plt_to_dataframe", "size": size, "time": elapsed})
+        elapsed = common.time_function(plt.plt_to_dataframe, plt_content.encode())
+        results.append(
+            {"name": "plt_to_dataframe_bytes", "size": size, "time": elapsed}
+        )
+        if compare_legacy:
+            elapsed = common.time_function(
+                legacy.plt_to_dataframe, plt_content, repeat=1
+            )
+            results.append(
+                {"name": "legacy_plt_to_dataframe", "size": size, "time": elapsed}
+            )
+            # Both parsers must produce the same frame
+            pd.testing.assert_frame_equal(
+                plt.plt_to_dataframe(plt_content), legacy.plt_to_dataframe(plt_content)
+            )
+    return results
+
+
+if __name__ == "__main__":
+    # Other sizes can be given on the command line, e.g. 10000000 for 10M values
+    sizes = [int(x) for x in sys.argv[1:]]
+    print(common.results_to_string(run(sizes=sizes) if sizes else run()))
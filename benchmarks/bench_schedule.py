@@ -0,0 +1,40 @@
+import random
+import dclab.core as core
+from dclab.core import schedule
+from benchmarks import common
+
+
+def generate_node_graph(n_nodes, max_parents=2, seed=0):
+    # Layered graph where most nodes share ancestors (diamond dependencies)
+    generator = random.Random(seed)
+    nodes = list()
+    for i in range(n_nodes):
+        node = core.Node()
+        if nodes:
+            n_parents = generator.randint(1, min(max_parents, len(nodes)))
+            for j, parent in enumerate(generator.sample(nodes[-50:], n_parents)):
+                dependency = core.Dependency(source_node=parent, attribute="data")
+                node.add_attribute("input_{}".format(j), dependency)
+        nodes.append(node)
+    return nodes
+
+
+def run(sizes=(100, 1000, 5000)):
+    results = list()
+    for size in sizes:
+        nodes = generate_node_graph(size)
+        tail_nodes = schedule.get_tail_nodes(schedule.collect_nodes(nodes))
+        elapsed = common.time_function(
+            schedule.extract_schedule_from_node_list, tail_nodes
+        )
+        results.append({"name": "extract_schedule", "size": size, "time": elapsed})
+        current_schedule = schedule.extract_schedule_from_node_list(tail_nodes)
+        elapsed = common.time_function(
+            schedule.schedule_consistency_check, current_schedule
+        )
+        results.append({"name": "consistency_check", "size": size, "time": elapsed})
+    return results
+
+
+if __name__ == "__main__":
+    print(common.results_to_string(run()))
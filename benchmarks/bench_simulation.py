@@ -0,0 +1,80 @@
+import pathlib
+import tempfile
+import numpy as np
+import pandas as pd
+import dclab.core as core
+import dclab.core.decorators as decorators
+from dclab.core import tools
+from benchmarks import common, generators
+
+
+class ToolNode(core.Node):
+    # Runs a (fake) tool and keeps a small frame, like the Sentaurus nodes do
+    def __init__(self, tool, parameter, source_node=None, n_values=1000):
+        super(ToolNode, self).__init__()
+        self.tool = tool
+        self.parameter = parameter
+        self.n_values = n_values
+        if source_node is not None:
+            self.data = core.Dependency(source_node=source_node, attribute="data")
+
+    def list_dependent_state_variables(self, state):
+        return [self.parameter]
+
+    def initialize(self, state):
+        self.value = float(state[self.parameter])
+
+    @decorators.record_output
+    def run(self):
+        tools.run_tool(self.tool, [self.value], cwd=self.sim_dir)
+        self.node_output["data"] = pd.DataFrame(
+            {"value": np.full(self.n_values, self.value)}
+        )
+
+    def output(self):
+        return {self.tool: self.node_output["data"]["value"].mean()}
+
+
+def build_simulation(directory, n_rows, **kwargs):
+    # Process -> structure -> device -> extraction chain, one parameter each
+    doe_filename = generators.generate_doe(directory / "doe.csv", n_rows)
+    defaults_filename = generators.generate_defaults(directory / "defaults.csv")
+    simulation = core.Simulation(
+        doe_filename=str(doe_filename),
+        defaults_filename=str(defaults_filename),
+        **kwargs
+    )
+    process = ToolNode("sprocess", "x0")
+    structure = ToolNode("sde", "x1", source_node=process)
+    device = ToolNode("sdevice", "x2", source_node=structure)
+    simulation.add_node(ToolNode("tdx", "x3", source_node=device))
+    return simulation
+
+
+def run_simulation(directory, n_rows, **kwargs):
+    simulation = build_simulation(directory, n_rows, **kwargs)
+    simulation.run_simulation()
+    return simulation
+
+
+def run(sizes=(10, 100), tool_delay=0):
+    results = list()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        executables = generators.write_fake_tools(directory / "bin", delay=tool_delay)
+        tools.configure(executables=executables)
+        try:
+            for size in sizes:
+                elapsed = common.time_function(
+                    run_simulation, directory, size, repeat=1
+                )
+                results.append(
+                    {"name": "run_simulation", "size": size, "time": elapsed}
+                )
+        finally:
+            tools.configure()
+    return results
+
+
+if __name__ == "__main__":
+    print(common.results_to_string(run()))
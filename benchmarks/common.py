@@ -0,0 +1,18 @@
+import time
+import tabulate
+
+
+def time_function(function, *args, repeat=5, **kwargs):
+    # Best of several runs, in seconds
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def results_to_string(results):
+    headers = ["Benchmark", "Size", "Time [ms]"]
+    rows = [[x["name"], x["size"], "{:.3f}".format(1e3 * x["time"])] for x in results]
+    return tabulate.tabulate(rows, headers=headers)
@@ -0,0 +1,128 @@
+import pathlib
+import numpy as np
+import pandas as pd
+
+_DATASET_TEMPLATE = (
+    '  Dataset ("{p}") {{\n'
+    "    function  = {p}\n"
+    "    type      = scalar\n"
+    "    dimension = 1\n"
+    "    location  = vertex\n"
+    '    validity  = [ "{r}" ]\n'
+    "    Values ({n}) {{\n{v}\n    }}\n"
+    "  }}\n"
+)
+
+
+def _format_values(values, per_line=8):
+    lines = list()
+    for i in range(0, len(values), per_line):
+        lines.append(" " + " ".join(values[i : i + per_line]))
+    return "\n".join(lines)
+
+
+def generate_dfise(n_vertices, n_regions=4, n_parameters=8, seed=0):
+    # 2D DF-ISE grid and dataset strings, neighbouring regions share one vertex
+    generator = np.random.RandomState(seed)
+    coordinates = generator.uniform(0, 1, size=(n_vertices, 2))
+    vertices = "\n".join(" {:.8e} {:.8e}".format(x, y) for x, y in coordinates)
+    grd = (
+        "DF-ISE text\n\nInfo {{\n  version = 1.0\n  type = grid\n  dimension = 2\n"
+        "  nb_vertices = {n}\n  nb_regions = {r}\n}}\n\n"
+        "Data {{\n  CoordSystem {{\n    translate = [ 0 0 ]\n  }}\n\n"
+        "  Vertices ({n}) {{\n{v}\n  }}\n}}\n"
+    ).format(n=n_vertices, r=n_regions, v=vertices)
+
+    regions = ["Region_{}".format(i) for i in range(n_regions)]
+    bounds = np.linspace(0, n_vertices, n_regions + 1).astype(int)
+    region_vertices = [
+        np.arange(max(bounds[i] - 1, 0), bounds[i + 1]) for i in range(n_regions)
+    ]
+    parameters = ["VertexIndex"]
+    parameters += ["Parameter_{}".format(i) for i in range(n_parameters)]
+
+    datasets = list()
+    dataset_names = list()
+    for parameter in parameters:
+        for region, indices in zip(regions, region_vertices):
+            if parameter == "VertexIndex":
+                values = [str(x) for x in indices]
+            else:
+                data = generator.normal(size=len(indices))
+                values = ["{:.8e}".format(x) for x in data]
+            dataset_names.append(parameter)
+            datasets.append(
+                _DATASET_TEMPLATE.format(
+                    p=parameter, r=region, n=len(values), v=_format_values(values)
+                )
+            )
+    dat = (
+        "DF-ISE text\n\nInfo {{\n  version   = 1.0\n  type      = dataset\n"
+        "  dimension = 2\n  nb_vertices = {n}\n  regions   = [ {r} ]\n"
+        "  datasets  = [ {d} ]\n}}\n\nData {{\n\n{data}\n}}\n"
+    ).format(
+        n=n_vertices,
+        r=" ".join('"{}"'.format(x) for x in regions),
+        d=" ".join('"{}"'.format(x) for x in dataset_names),
+        data="\n".join(datasets),
+    )
+    return grd, dat
+
+
+def generate_plt(n_values, n_columns=8, seed=0):
+    # sdevice style xy-plot with n_values numbers in the data block
+    generator = np.random.RandomState(seed)
+    n_rows = max(n_values // n_columns, 1)
+    labels = ["time"] + ["n{} OuterVoltage".format(i) for i in range(n_columns - 1)]
+    data = generator.normal(size=(n_rows, n_columns))
+    rows = "\n".join(" " + " ".join("{:.8e}".format(x) for x in row) for row in data)
+    return (
+        "DF-ISE text\n\nInfo {{\n  version = 1.0\n  type = xyplot\n"
+        "  datasets = [\n    {labels} ]\n  functions = [\n    {functions} ]\n}}\n\n"
+        "Data {{\n{rows}\n}}\n"
+    ).format(
+        labels=" ".join('"{}"'.format(x) for x in labels),
+        functions=" ".join(["Dimensionless"] * n_columns),
+        rows=rows,
+    )
+
+
+def generate_doe(filename, n_rows, n_parameters=4, n_levels=3, seed=0):
+    # Parameters only take a few levels, so nodes repeat between rows
+    generator = np.random.RandomState(seed)
+    columns = {
+        "x{}".format(i): generator.randint(n_levels, size=n_rows).astype(float)
+        for i in range(n_parameters)
+    }
+    pd.DataFrame(columns).to_csv(filename, index=False)
+    return filename
+
+
+def generate_defaults(filename, n_parameters=4, n_extra=16):
+    # Defaults overridden by the DOE plus parameters only set here
+    defaults = {"x{}".format(i): 0.0 for i in range(n_parameters)}
+    defaults.update({"default_{}".format(i): float(i) for i in range(n_extra)})
+    pd.DataFrame(defaults, index=[0]).to_csv(filename, index=False)
+    return filename
+
+
+_FAKE_TOOL_TEMPLATE = (
+    "#!/bin/sh\n"
+    "# Stand-in for {tool}, waits and writes a result to the working directory\n"
+    "sleep {delay}\n"
+    'echo "{tool} $@" > {tool}_result.txt\n'
+)
+
+
+def write_fake_tools(directory, tools=("sprocess", "sde", "sdevice", "tdx"), delay=0):
+    # Returns tool -> executable, to be passed to dclab.core.tools.configure
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    executables = {}
+    for tool in tools:
+        filename = directory / tool
+        with open(filename, "w") as f:
+            f.write(_FAKE_TOOL_TEMPLATE.format(tool=tool, delay=delay))
+        filename.chmod(0o755)
+        executables[tool] = str(filename)
+    return executables
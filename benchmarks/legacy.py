@@ -0,0 +1,120 @@
+# Reference implementations replaced in dclab, kept to compare against
+import re
+from io import StringIO
+import numpy as np
+import pandas as pd
+
+
+def extract_region_masks(vertex_dict, target_frame):
+    for key, value in vertex_dict.items():
+        target_frame[key] = pd.Series(data=np.ones(np.array(value).shape), index=value)
+        target_frame[key].fillna(value=0, inplace=True)
+    return target_frame
+
+
+def match_vertex_with_data_to_series(vertex_dict, data_dict):
+    output_vertices = list()
+    output_data = list()
+    for key, data in data_dict.items():
+        assert key in vertex_dict
+        vertices = vertex_dict[key]
+        assert len(data) == len(vertices)
+        output_vertices += vertices
+        output_data += data
+    output_series = pd.Series(data=output_data, index=output_vertices).sort_index()
+    output_series = output_series[~output_series.index.duplicated(keep="first")]
+    return output_series
+
+
+def extract_data_for_parameter(dat, parameter_name, is_integer=False):
+    elements = dat.split("Data ")[1].split('"' + parameter_name + '"')[1:]
+    output_dict = {}
+    for element in elements:
+        region_name = element.split("validity")[1].split('"')[1]
+        type = element.split("type")[1].split("\n")[0].replace("=", "").replace(" ", "")
+        if type == "scalar":
+            data_str = (
+                element.split("Values")[1]
+                .split("{")[1]
+                .split("}")[0]
+                .replace("\n", "")
+                .strip()
+                .split(" ")
+            )
+            converter = lambda x: float(x)
+            if is_integer:
+                converter = lambda x: int(float(x))
+            data = list(map(converter, data_str))
+            output_dict[region_name] = data
+    return output_dict
+
+
+def parse_dfise_str(grd, dat):
+    # Vertices
+    vertices_str = (
+        "X Y" + grd.split("Data {")[1].split("Vertices")[1].split("{")[1].split("}")[0]
+    )
+    output_frame = pd.read_csv(StringIO(vertices_str), delim_whitespace=True)
+
+    # Parameters
+    parameter_list_str = (
+        dat.split("datasets")[1].split("[")[1].split("]")[0].strip().split('" "')
+    )
+    replacer = lambda s: s.replace('"', "")
+    parameter_list = list(set(map(replacer, parameter_list_str)))
+    assert "VertexIndex" in parameter_list
+    indices = extract_data_for_parameter(
+        dat=dat, parameter_name="VertexIndex", is_integer=True
+    )
+
+    for parameter in parameter_list:
+        # Get data from dfise string
+        dataset = extract_data_for_parameter(dat=dat, parameter_name=parameter)
+        # Match to vertex index
+        data_series = match_vertex_with_data_to_series(
+            vertex_dict=indices, data_dict=dataset
+        )
+        # Add to output dataframe
+        output_frame[parameter] = data_series
+    output_frame = extract_region_masks(vertex_dict=indices, target_frame=output_frame)
+    return output_frame
+
+
+def plt_to_dataframe(plt_content):
+
+    s_labels = plt_content.split("]")[0].split("[")[1].replace("\n", " ")
+
+    a_labels = (
+        re.sub(" +", " ", s_labels)
+        .replace('" "', ",")
+        .replace(' "', "")
+        .replace('" ', "")
+        .split(",")
+    )
+
+    # Convert string to list of strings
+    data = plt_content.split("Data {")[1].replace("}", "").replace("\n", " ")
+    data = re.sub(" +", " ", data).split(" ")
+    data = list(filter(None, data))
+
+    n_columns = len(a_labels)
+    assert len(data) % n_columns == 0
+    n_rows = int(len(data) / n_columns)
+    data_n = np.asarray(data).astype(float).reshape((n_rows, n_columns))
+
+    dataframe = pd.DataFrame(data=data_n, columns=a_labels)
+    return dataframe
+
+
+def merge_frames(default_frame, doe_frame):
+    new_nrows = doe_frame.shape[0]
+    default_frame = default_frame.drop(columns=doe_frame.columns)
+    if new_nrows > 1:
+        default_frame = default_frame.append([default_frame] * (new_nrows - 1))
+    default_frame = default_frame.set_index(keys=doe_frame.index)
+    return doe_frame.join(default_frame, how="inner")
+
+
+def add_data_to_all_rows(memory, name, data):
+    for i in memory.data_frame.index:
+        memory.add_data_at_index(name=name, data=data, index=i)
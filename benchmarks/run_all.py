@@ -0,0 +1,133 @@
+import argparse
+import datetime
+import json
+import pathlib
+import subprocess
+import tabulate
+from benchmarks import (
+    common,
+    bench_dependency,
+    bench_dfise,
+    bench_memory,
+    bench_plt,
+    bench_schedule,
+    bench_simulation,
+)
+
+RESULTS_DIRECTORY = pathlib.Path(__file__).parent / "results"
+
+# Small sizes for quick checks, large ones for production scale
+SIZES = {
+    "quick": {
+        "memory": (100, 1000),
+        "dependency": (10, 100),
+        "schedule": (100, 1000),
+        "dfise": (1000, 10000),
+        "plt": (1000, 10000),
+        "simulation": (10,),
+    },
+    "full": {
+        "memory": (100, 1000, 10000, 50000),
+        "dependency": (10, 100, 1000),
+        "schedule": (100, 1000, 5000),
+        "dfise": (1000, 10000, 100000),
+        "plt": (1000, 10000, 100000, 1000000),
+        "simulation": (10, 100),
+    },
+}
+
+
+def current_commit():
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=str(pathlib.Path(__file__).parent),
+                stdout=subprocess.PIPE,
+                check=True,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(scale="quick"):
+    sizes = SIZES[scale]
+    results = list()
+    results += bench_memory.run(sizes=sizes["memory"])
+    results += bench_dependency.run(sizes=sizes["dependency"])
+    results += bench_schedule.run(sizes=sizes["schedule"])
+    results += bench_dfise.run(sizes=sizes["dfise"], compare_legacy=False)
+    results += bench_plt.run(sizes=sizes["plt"], compare_legacy=False)
+    results += bench_simulation.run(sizes=sizes["simulation"])
+    return results
+
+
+def save_results(results, scale, filename=None):
+    commit = current_commit()
+    if filename is None:
+        RESULTS_DIRECTORY.mkdir(exist_ok=True)
+        filename = RESULTS_DIRECTORY / "{}_{}.json".format(commit, scale)
+    with open(filename, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "commit": commit,
+                    "scale": scale,
+                    "date": datetime.datetime.now().isoformat(),
+                    "results": results,
+                },
+                indent=3,
+            )
+        )
+    return filename
+
+
+def load_results(filename):
+    with open(filename, "r") as f:
+        return json.loads(f.read())
+
+
+def compare_to_string(baseline, current):
+    # Ratios above 1 mean the current commit is slower
+    baseline_times = {(x["name"], x["size"]): x["time"] for x in baseline["results"]}
+    rows = list()
+    for x in current["results"]:
+        key = (x["name"], x["size"])
+        if key not in baseline_times:
+            continue
+        rows.append(
+            [
+                x["name"],
+                x["size"],
+                "{:.3f}".format(1e3 * baseline_times[key]),
+                "{:.3f}".format(1e3 * x["time"]),
+                "{:.2f}".format(x["time"] / baseline_times[key]),
+            ]
+        )
+    headers = [
+        "Benchmark",
+        "Size",
+        baseline["commit"] + " [ms]",
+        current["commit"] + " [ms]",
+        "Ratio",
+    ]
+    return tabulate.tabulate(rows, headers=headers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the dclab benchmarks")
+    parser.add_argument("--scale", choices=sorted(SIZES), default="quick")
+    parser.add_argument("--output", help="results file, default results/<commit>")
+    parser.add_argument("--compare", help="results file of an earlier commit")
+    arguments = parser.parse_args()
+
+    results = run(scale=arguments.scale)
+    filename = save_results(results, arguments.scale, filename=arguments.output)
+    print(common.results_to_string(results))
+    print("Results written to {}".format(filename))
+    if arguments.compare:
+        baseline = load_results(arguments.compare)
+        print(compare_to_string(baseline, load_results(filename)))
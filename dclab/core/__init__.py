@@ -1,3 +1,3 @@
 from .node import Node
 from .simulation import Simulation
-from .dependency import Dependency, FileDependency
\ No newline at end of file
+from .dependency import Dependency, FileDependency
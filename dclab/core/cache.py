@@ -0,0 +1,374 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+import uuid
+from . import storage, utilities
+
+
+# Set per schedule or row, not part of what a node computes
+RUNTIME_CONFIGURATION = ("name", "sim_dir", "fingerprint")
+
+
+def node_configuration(node):
+    # Type and plain configuration values of a node as saved by save_state
+    configuration = {
+        key: value
+        for key, value in node.__internal_state__.items()
+        if isinstance(value, (str, int, float, bool, type(None)))
+        and key not in RUNTIME_CONFIGURATION
+    }
+    return {
+        "type": "{}.{}".format(type(node).__module__, type(node).__name__),
+        "configuration": configuration,
+    }
+
+
+def link_file(source, target):
+    # Hard link where possible, copies across file systems. The link is made
+    # under a temporary name and moved into place so existing targets are
+    # replaced atomically.
+    source = str(source)
+    target = pathlib.Path(target)
+    if target.exists() and os.path.samefile(source, str(target)):
+        return target
+    temporary_target = target.parent / ".{}.{}".format(target.name, uuid.uuid4().hex)
+    try:
+        os.link(source, str(temporary_target))
+    except OSError:
+        shutil.copy2(source, str(temporary_target))
+    os.replace(str(temporary_target), str(target))
+    return target
+
+
+def node_state_matches(node_file, fingerprint):
+    # The node state must still belong to the fingerprint and be complete
+    try:
+        with open(node_file, "r") as f:
+            node_state = json.loads(f.read())
+    except (OSError, ValueError):
+        return False
+    return node_state.get("fingerprint") == fingerprint and "node_output" in node_state
+
+
+class NodeIndex(object):
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.entries = {}
+        self.__offset = 0
+        self.__lock = threading.Lock()
+        if self.filename is not None:
+            self.filename = pathlib.Path(self.filename)
+            self.refresh()
+
+    def refresh(self):
+        # Read entries appended by other rows since the last refresh
+        if self.filename is None or not self.filename.is_file():
+            return
+        with self.__lock:
+            with open(self.filename, "rb") as f:
+                f.seek(self.__offset)
+                for line in f:
+                    # Skip entries that are still being written
+                    if not line.endswith(b"\n"):
+                        break
+                    self.__offset += len(line)
+                    entry = json.loads(line.decode())
+                    self.__add_entry(entry["node"], entry["fingerprint"], entry["path"])
+
+    def lookup(self, node_name, fingerprint):
+        path = self.entries.get(node_name, {}).get(fingerprint)
+        if path is None:
+            self.refresh()
+            path = self.entries.get(node_name, {}).get(fingerprint)
+        if path is None:
+            return None
+        # Folders are rewritten when a later run gives a row other inputs
+        if not node_state_matches(path, fingerprint):
+            with self.__lock:
+                if self.entries[node_name].get(fingerprint) == path:
+                    del self.entries[node_name][fingerprint]
+            return None
+        return pathlib.Path(path)
+
+    def add(self, node_name, fingerprint, node_file):
+        node_file = str(node_file)
+        if self.lookup(node_name, fingerprint) is not None:
+            return
+        with self.__lock:
+            self.__add_entry(node_name, fingerprint, node_file)
+            if self.filename is not None:
+                line = json.dumps(
+                    {"node": node_name, "fingerprint": fingerprint, "path": node_file}
+                )
+                # Single appends keep concurrent writers from interleaving lines
+                fd = os.open(
+                    str(self.filename), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+                )
+                try:
+                    os.write(fd, (line + "\n").encode())
+                finally:
+                    os.close(fd)
+
+    def __add_entry(self, node_name, fingerprint, node_file):
+        # Later entries replace stale ones with the same fingerprint
+        self.entries.setdefault(node_name, {})[fingerprint] = node_file
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes
+        state = self.__dict__.copy()
+        del state["_NodeIndex__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(x) for x in self.entries.values())
+
+
+class ResultCache(object):
+    def __init__(self, directory, max_size=None, max_entries=None):
+        self.directory = pathlib.Path(directory)
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.entry_directory = self.directory / "entries"
+        self.entry_directory.mkdir(parents=True, exist_ok=True)
+        self.lock_filename = self.directory / "cache.lock"
+
+    @contextlib.contextmanager
+    def locked(self, shared=False):
+        # File lock shared by all processes using the same cache directory
+        with open(self.lock_filename, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def cache_key(node):
+        # Besides the fingerprint the node type and its configuration must match
+        key_string = json.dumps(
+            {**node_configuration(node), "fingerprint": node.fingerprint},
+            sort_keys=True,
+        )
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def restore(self, node, folder_name):
+        folder_name = pathlib.Path(folder_name)
+        entry = self.entry_directory / self.cache_key(node)
+        with self.locked(shared=True):
+            manifest_file = entry / "manifest.json"
+            if not manifest_file.is_file():
+                return False
+            with open(manifest_file, "r") as f:
+                manifest = json.loads(f.read())
+            output_manifest = manifest["node_output"]
+            for filename in manifest["output_files"] + storage.list_output_files(
+                output_manifest
+            ):
+                shutil.copy2(str(entry / filename), str(folder_name / filename))
+            node.node_output = storage.LazyOutputs(output_manifest, folder_name)
+            # Access time drives the LRU eviction
+            os.utime(str(manifest_file))
+        node.output_files = [str(folder_name / f) for f in manifest["output_files"]]
+        return True
+
+    def store(self, node, folder_name):
+        folder_name = pathlib.Path(folder_name)
+        entry = self.entry_directory / self.cache_key(node)
+        if (entry / "manifest.json").is_file():
+            return
+        # Entries are assembled in a temporary folder and moved into place
+        temporary_entry = self.directory / "tmp_{}".format(uuid.uuid4().hex)
+        temporary_entry.mkdir()
+        try:
+            output_files = list()
+            for filename in node.output_files:
+                if os.path.isfile(filename):
+                    basename = os.path.basename(filename)
+                    shutil.copy2(filename, str(temporary_entry / basename))
+                    output_files.append(basename)
+            with open(folder_name / "node_state.json", "r") as f:
+                output_manifest = json.loads(f.read())["node_output"]
+            for filename in storage.list_output_files(output_manifest):
+                shutil.copy2(
+                    str(folder_name / filename), str(temporary_entry / filename)
+                )
+            size = sum(f.stat().st_size for f in temporary_entry.iterdir())
+            manifest = {
+                "node": node.name,
+                "output_files": output_files,
+                "node_output": output_manifest,
+                "size": size,
+            }
+            with open(temporary_entry / "manifest.json", "w") as f:
+                f.write(json.dumps(manifest, indent=3))
+            with self.locked():
+                if not entry.exists():
+                    os.rename(str(temporary_entry), str(entry))
+                self.evict()
+        finally:
+            if temporary_entry.exists():
+                shutil.rmtree(str(temporary_entry))
+
+    def list_entries(self):
+        entries = list()
+        for entry in self.entry_directory.iterdir():
+            manifest_file = entry / "manifest.json"
+            if manifest_file.is_file():
+                with open(manifest_file, "r") as f:
+                    size = json.loads(f.read())["size"]
+                entries.append((manifest_file.stat().st_mtime, size, entry))
+        return sorted(entries)
+
+    def size(self):
+        return sum(x[1] for x in self.list_entries())
+
+    def evict(self):
+        # Removes least recently used entries, caller must hold the lock
+        entries = self.list_entries()
+        total_size = sum(x[1] for x in entries)
+        while entries and (
+            (self.max_size is not None and total_size > self.max_size)
+            or (self.max_entries is not None and len(entries) > self.max_entries)
+        ):
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(str(entry))
+            total_size -= size
+
+
+class ConversionCache(object):
+    # Files converted by a tool, keyed on the content of the converted file.
+    # Entries are read-only and linked into the run directories.
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.entry_directory = self.directory / "entries"
+        self.entry_directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def cache_key(filename, arguments):
+        key_string = json.dumps(
+            {
+                "arguments": [str(x) for x in arguments],
+                "source": utilities.hash_file(filename),
+            }
+        )
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def restore(self, key, output_directory):
+        # Returns the linked files, None if the conversion is not cached
+        entry = self.entry_directory / key
+        if not entry.is_dir():
+            return None
+        output_directory = pathlib.Path(output_directory)
+        return [
+            link_file(filename, output_directory / filename.name)
+            for filename in sorted(entry.iterdir())
+        ]
+
+    @contextlib.contextmanager
+    def workspace(self):
+        # Empty folder next to the entries to run a conversion in
+        workspace = self.directory / "tmp_{}".format(uuid.uuid4().hex)
+        workspace.mkdir()
+        try:
+            yield workspace
+        finally:
+            if workspace.exists():
+                shutil.rmtree(str(workspace))
+
+    def store(self, key, filenames):
+        entry = self.entry_directory / key
+        if entry.is_dir():
+            return
+        temporary_entry = self.directory / "tmp_{}".format(uuid.uuid4().hex)
+        temporary_entry.mkdir()
+        try:
+            for filename in filenames:
+                filename = pathlib.Path(filename)
+                target = temporary_entry / filename.name
+                link_file(filename, target)
+                # Protects the entry from tools writing to a linked copy
+                target.chmod(0o444)
+            try:
+                os.rename(str(temporary_entry), str(entry))
+            except OSError:
+                # Another row stored the same conversion first
+                if not entry.is_dir():
+                    raise
+        finally:
+            if temporary_entry.exists():
+                shutil.rmtree(str(temporary_entry))
+
+    def clear(self):
+        shutil.rmtree(str(self.entry_directory))
+        self.entry_directory.mkdir(parents=True, exist_ok=True)
+
+
+class ObjectStore(object):
+    # Content-addressed files shared by all rows of a simulation. Run folders
+    # hold hard links to the read-only objects, an object only linked from
+    # the store is no longer used and removed by collect.
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.object_directory = self.directory / "objects"
+        self.object_directory.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, digest):
+        return self.object_directory / digest[:2] / digest
+
+    def add(self, filename):
+        # Replaces the file by a link to the object with the same content
+        filename = pathlib.Path(filename)
+        object_file = self.object_path(utilities.hash_file(filename))
+        if not object_file.exists():
+            object_file.parent.mkdir(exist_ok=True)
+            temporary_file = object_file.parent / ".{}.{}".format(
+                object_file.name, uuid.uuid4().hex
+            )
+            link_file(filename, temporary_file)
+            # Protects the object from tools writing to a linked copy
+            temporary_file.chmod(0o444)
+            os.replace(str(temporary_file), str(object_file))
+        link_file(object_file, filename)
+        return object_file
+
+    def add_files(self, filenames):
+        return [self.add(x) for x in filenames if os.path.isfile(x)]
+
+    @staticmethod
+    def detach(directory):
+        # Removes links to objects, e.g. before a node runs again in a folder
+        # of an earlier run and would otherwise write through them
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_nlink > 1 and not stat.st_mode & 0o222:
+                        os.remove(entry.path)
+
+    def list_objects(self):
+        return [
+            x for x in self.object_directory.glob("*/*") if not x.name.startswith(".")
+        ]
+
+    def size(self):
+        return sum(x.stat().st_size for x in self.list_objects())
+
+    def collect(self):
+        # Garbage collection, e.g. after Node.clean_up removed the run files
+        removed, freed = 0, 0
+        for object_file in self.list_objects():
+            stat = object_file.stat()
+            if stat.st_nlink == 1:
+                object_file.unlink()
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
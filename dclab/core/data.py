@@ -1,4 +1,6 @@
+import collections
 import pathlib
+import numpy as np
 import pandas as pd
 
 
@@ -10,6 +12,13 @@ def is_numeric(s):
         return False
 
 
+def broadcast_value(data, n_rows):
+    # Numbers become float columns like in add_data_at_index, the rest objects
+    if is_numeric(data) and not isinstance(data, str):
+        return np.full(n_rows, data, dtype=float)
+    return np.full(n_rows, data, dtype=object)
+
+
 class SimulationMemory(object):
     def __init__(self):
         self.data_frame = pd.DataFrame()
@@ -31,18 +40,21 @@ class SimulationMemory(object):
     @staticmethod
     def merge_frames(default_frame, doe_frame):
         # Step 0: retrieve rows for current and new test frames
-        new_nrows = doe_frame.shape[0]
         current_nrows = default_frame.shape[0]
         assert current_nrows == 1
         # Step 1: remove defaults rows to be overridden
         default_frame = default_frame.drop(columns=doe_frame.columns)
-        # Step 2: extend data frame to correct length
-        if new_nrows > 1:
-            default_frame = default_frame.append([default_frame] * (new_nrows - 1))
-        default_frame = default_frame.set_index(keys=doe_frame.index)
+        # Step 2: broadcast the defaults row, one array per column
+        default_frame = pd.DataFrame(
+            {
+                name: np.repeat(default_frame[name].values, len(doe_frame.index))
+                for name in default_frame.columns
+            },
+            index=doe_frame.index,
+            columns=default_frame.columns,
+        )
         # Step 3: join new frame with existing frame
-        default_frame = doe_frame.join(default_frame, how="inner")
-        return default_frame
+        return pd.concat([doe_frame, default_frame], axis=1)
 
     def export_to_csv(self, filename):
 
@@ -62,8 +74,34 @@ class SimulationMemory(object):
         return
 
     def add_data_to_all_rows(self, name, data):
-        for i in self.data_frame.index:
-            self.add_data_at_index(name=name, data=data, index=i)
+        self.set_column(name=name, data=data)
+
+    def set_column(self, name, data):
+        # Scalars are broadcast to all rows, sequences hold one value per row
+        if np.ndim(data) == 0:
+            data = broadcast_value(data, self.size())
+        elif len(data) != self.size():
+            raise ValueError(
+                "Column {} has {} values for {} rows".format(
+                    name, len(data), self.size()
+                )
+            )
+        self.data_frame[name] = pd.Series(data, index=self.data_frame.index)
+
+    def set_columns(self, columns):
+        # Several columns at once, new columns are added in a single step
+        new_columns = {}
+        for name, data in columns.items():
+            if name in self.data_frame.columns:
+                self.set_column(name=name, data=data)
+            else:
+                new_columns[name] = data
+        if new_columns:
+            new_frame = SimulationMemory()
+            new_frame.data_frame = pd.DataFrame(index=self.data_frame.index)
+            for name, data in new_columns.items():
+                new_frame.set_column(name=name, data=data)
+            self.data_frame = pd.concat([self.data_frame, new_frame.data_frame], axis=1)
 
     def get_column(self, name, to_float=True):
         if name in self.data_frame.columns:
@@ -79,3 +117,205 @@ class SimulationMemory(object):
 
     def size(self):
         return len(self.data_frame.index)
+
+
+class StreamingSimulationMemory(SimulationMemory):
+    # DOE rows are read in chunks when they are first needed and only the most
+    # recently used chunks are kept. Columns added to all rows are stored as a
+    # scalar or a function of the row index and applied to each chunk.
+    def __init__(self, chunk_size=10000, max_chunks=2):
+        super(StreamingSimulationMemory, self).__init__()
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.doe_filename = None
+        self.n_rows = 0
+        self.columns = collections.OrderedDict()
+        self.overrides = {}
+        self.override_columns = collections.OrderedDict()
+        self.__chunks = collections.OrderedDict()
+        self.__reader = None
+        self.__next_chunk = 0
+
+    def load_doe(self, filename):
+        self.doe_filename = filename
+        # Only the first column is parsed to count the rows
+        self.n_rows = sum(
+            len(x)
+            for x in pd.read_csv(
+                filename, index_col=False, usecols=[0], chunksize=self.chunk_size
+            )
+        )
+        self.__clear_chunks()
+
+    def set_column(self, name, data):
+        if np.ndim(data) != 0 and not callable(data):
+            raise ValueError(
+                "Column {} must be a scalar or a function of the row index".format(name)
+            )
+        self.columns[name] = data
+        self.__clear_chunks()
+
+    def set_columns(self, columns):
+        for name, data in columns.items():
+            self.set_column(name=name, data=data)
+
+    def add_data_at_index(self, name, data, index=0):
+        self.overrides.setdefault(index, {})[name] = data
+        # New columns are added to all rows like in SimulationMemory
+        if name not in self.override_columns:
+            self.override_columns[name] = float if is_numeric(data) else object
+        for chunk in self.__chunks.values():
+            self.__add_override_column(chunk, name)
+        chunk = self.__chunks.get(index // self.chunk_size)
+        if chunk is not None:
+            chunk.at[index, name] = data
+
+    def get_column(self, name, to_float=True):
+        columns = list()
+        for chunk_id in range(self.__n_chunks()):
+            chunk = self.__chunk(chunk_id)
+            if name not in chunk.columns:
+                return None
+            columns.append(chunk[name])
+        return pd.concat(columns)
+
+    def get_value(self, name, index=0):
+        row = self.get_row(index)
+        if name in row.index:
+            return row[name]
+
+    def get_row(self, index=0):
+        chunk_id = index // self.chunk_size
+        return self.__chunk(chunk_id).iloc[index - chunk_id * self.chunk_size]
+
+    def size(self):
+        if self.doe_filename is None:
+            return super(StreamingSimulationMemory, self).size()
+        return self.n_rows
+
+    def export_to_csv(self, filename):
+        for chunk_id in range(self.__n_chunks()):
+            self.__chunk(chunk_id).to_csv(
+                path_or_buf=filename,
+                mode="w" if chunk_id == 0 else "a",
+                header=chunk_id == 0,
+                index_label="ID",
+            )
+
+    def __n_chunks(self):
+        return -(-self.size() // self.chunk_size)
+
+    def __clear_chunks(self):
+        self.__chunks = collections.OrderedDict()
+        self.__reader = None
+
+    def __chunk(self, chunk_id):
+        if chunk_id in self.__chunks:
+            self.__chunks.move_to_end(chunk_id)
+        else:
+            self.__chunks[chunk_id] = self.__read_chunk(chunk_id)
+            while len(self.__chunks) > self.max_chunks:
+                self.__chunks.popitem(last=False)
+        return self.__chunks[chunk_id]
+
+    def __read_chunk(self, chunk_id):
+        start = chunk_id * self.chunk_size
+        if self.doe_filename is None:
+            frame = self.data_frame.copy()
+        else:
+            # Sequential chunks continue the reader, anything else starts over
+            if self.__reader is None or chunk_id != self.__next_chunk:
+                self.__reader = pd.read_csv(
+                    self.doe_filename,
+                    index_col=False,
+                    chunksize=self.chunk_size,
+                    skiprows=range(1, start + 1),
+                )
+            frame = next(self.__reader)
+            self.__next_chunk = chunk_id + 1
+            frame.index = pd.RangeIndex(start, start + len(frame))
+            if self.data_frame.size != 0:
+                frame = SimulationMemory.merge_frames(self.data_frame, frame)
+        for name, data in self.columns.items():
+            if callable(data):
+                values = [data(i) for i in frame.index]
+            else:
+                values = broadcast_value(data, len(frame.index))
+            frame[name] = pd.Series(values, index=frame.index)
+        for name in self.override_columns:
+            self.__add_override_column(frame, name)
+        for index in frame.index.intersection(list(self.overrides)):
+            for name, data in self.overrides[index].items():
+                frame.at[index, name] = data
+        return frame
+
+    def __add_override_column(self, frame, name):
+        if name not in frame.columns:
+            frame[name] = pd.Series(
+                index=frame.index, dtype=self.override_columns[name]
+            )
+
+    def __getstate__(self):
+        # Chunks are read again in worker processes when needed
+        state = self.__dict__.copy()
+        state["_StreamingSimulationMemory__chunks"] = collections.OrderedDict()
+        state["_StreamingSimulationMemory__reader"] = None
+        return state
+
+
+class ResultWriter(object):
+    def __init__(self, filename, index_label="id"):
+        self.filename = pathlib.Path(filename)
+        self.index_label = index_label
+        self.columns = list()
+        self.last_index = None
+        self.is_sorted = True
+
+    def reset(self):
+        self.columns = list()
+        self.last_index = None
+        self.is_sorted = True
+        if self.filename.exists():
+            self.filename.unlink()
+
+    def append(self, index, row):
+        # Step 1: a new column forces a single rewrite with the column union
+        new_columns = [x for x in row if x not in self.columns]
+        if new_columns:
+            self.columns += new_columns
+            if self.filename.exists():
+                self.__rewrite(self.__read_text())
+        # Step 2: append the row to the file
+        new_row = pd.DataFrame(data=[row], index=[index], columns=self.columns)
+        new_row.to_csv(
+            path_or_buf=self.filename,
+            mode="a",
+            header=not self.filename.exists(),
+            index_label=self.index_label,
+        )
+        if self.last_index is not None and index < self.last_index:
+            self.is_sorted = False
+        self.last_index = index
+
+    def read(self):
+        if not self.filename.exists():
+            return pd.DataFrame()
+        return pd.read_csv(self.filename, index_col=0)
+
+    def finalize(self):
+        # Rows that finished out of order are sorted by index
+        if not self.is_sorted:
+            self.__rewrite(self.__read_text().sort_index())
+            self.is_sorted = True
+
+    def __read_text(self):
+        # Values are rewritten as they were written, e.g. "007" stays a string
+        frame = pd.read_csv(
+            self.filename, index_col=0, dtype=str, keep_default_na=False
+        )
+        frame.index = frame.index.astype(int)
+        return frame
+
+    def __rewrite(self, frame):
+        frame = frame.reindex(columns=self.columns)
+        frame.to_csv(path_or_buf=self.filename, index_label=self.index_label)
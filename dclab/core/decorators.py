@@ -1,29 +1,93 @@
 import functools
+import os
 import pathlib
-from os import listdir
-from os.path import isfile, join, getmtime
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+# Backend used by record_output, nodes can override it with 'output_tracker'
+DEFAULT_TRACKER = "scandir"
+
+
+def snapshot_directory(directory):
+    # File name -> (modification time in ns, size, change time in ns) from a
+    # single scandir pass. Linking a cached file only changes the change time.
+    snapshot = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                snapshot[entry.name] = (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    stat.st_ctime_ns,
+                )
+    return snapshot
+
+
+class ScandirTracker(object):
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot = snapshot_directory(directory)
+
+    def changed_files(self):
+        post = snapshot_directory(self.directory)
+        return sorted(x for x, value in post.items() if self.snapshot.get(x) != value)
+
+    def close(self):
+        return
+
+
+class InotifyTracker(object):
+    # Only files with events are looked at, a full scan is only needed if the
+    # event queue overflows
+    def __init__(self, directory):
+        self.directory = directory
+        self.inotify = inotify_simple.INotify()
+        flags = inotify_simple.flags
+        self.inotify.add_watch(
+            directory, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO
+        )
+
+    def changed_files(self):
+        names = set()
+        for event in self.inotify.read(timeout=0):
+            if event.mask & inotify_simple.flags.Q_OVERFLOW:
+                return sorted(snapshot_directory(self.directory))
+            if event.name:
+                names.add(event.name)
+        return sorted(
+            x for x in names if os.path.isfile(os.path.join(self.directory, x))
+        )
+
+    def close(self):
+        self.inotify.close()
+
+
+TRACKERS = {"scandir": ScandirTracker, "inotify": InotifyTracker}
+
+
+def create_tracker(directory, tracker=None):
+    if tracker is None:
+        tracker = DEFAULT_TRACKER
+    # Falls back to scanning if inotify is not available
+    if tracker == "inotify" and inotify_simple is None:
+        tracker = "scandir"
+    return TRACKERS[tracker](directory)
 
 
 def record_output(func):
     @functools.wraps(func)
     def wrapper_decorator(self, *args, **kwargs):
 
-        pre_files = [f for f in listdir(self.sim_dir) if isfile(join(self.sim_dir, f))]
-        pre_last_modified = [
-            getmtime(str(pathlib.Path(self.sim_dir) / f)) for f in pre_files
-        ]
-        pre = dict(zip(pre_files, pre_last_modified))
-        value = func(self, *args, **kwargs)
-        post_files = [f for f in listdir(self.sim_dir) if isfile(join(self.sim_dir, f))]
-        post_last_modified = [
-            getmtime(str(pathlib.Path(self.sim_dir) / f)) for f in post_files
-        ]
-        post = dict(zip(post_files, post_last_modified))
-        new_files = list(set(post_files) - set(pre_files))
-        modified_files = [
-            f for f in post_files if (f in pre) and not (pre[f] == post[f])
-        ]
-        new_files += modified_files
+        tracker = create_tracker(self.sim_dir, getattr(self, "output_tracker", None))
+        try:
+            value = func(self, *args, **kwargs)
+            new_files = tracker.changed_files()
+        finally:
+            tracker.close()
         self.output_files = [str(pathlib.Path(self.sim_dir) / f) for f in new_files]
         return value
 
@@ -1,6 +1,10 @@
+import copy
+import hashlib
+import os
 import pathlib
 import re
 import json
+from . import utilities
 
 
 class Dependency(object):
@@ -14,8 +18,18 @@ class Dependency(object):
     def __str__(self):
         return str(self.get())
 
+    def configuration(self):
+        # What is read from the source node, part of the reading node's key
+        return {"attribute": self.attribute}
+
     def __deepcopy__(self, memodict={}):
-        return self
+        # Dependencies are shared unless their source node is copied as well
+        source_node = memodict.get(id(self.source_node))
+        if source_node is None:
+            return self
+        dependency = copy.copy(self)
+        dependency.source_node = source_node
+        return dependency
 
 
 class FileDependency(Dependency):
@@ -35,11 +49,51 @@ class FileDependency(Dependency):
             output_files = output_files[self.select_id]
         return output_files
 
+    def configuration(self):
+        return {
+            **super(FileDependency, self).configuration(),
+            "file_filter": self.file_filter,
+            "select_id": self.select_id,
+        }
+
+
+def fingerprint_dependencies(
+    dependencies, parent_fingerprints, configuration=None, sources=None
+):
+    # Merkle-style fingerprint: parents contribute their own fingerprints and
+    # static files their content, so identical inputs match between simulations.
+    # Parents are included by value since their names depend on the schedule,
+    # keyed by the attribute reading them so that swapped parents differ.
+    static_files = {
+        x: utilities.hash_file(x) if os.path.isfile(x) else ""
+        for x in dependencies["static_files"]
+    }
+    if sources is None:
+        nodes = sorted(parent_fingerprints.get(x, "") for x in dependencies["nodes"])
+    else:
+        nodes = {
+            key: {**source, "node": parent_fingerprints.get(source["node"], "")}
+            for key, source in sources.items()
+        }
+    fingerprint_dict = {
+        "state_variables": dependencies["state_variables"],
+        "static_files": static_files,
+        "nodes": nodes,
+        "configuration": configuration,
+    }
+    fingerprint_string = json.dumps(
+        fingerprint_dict, sort_keys=True, cls=utilities.JsonEncoder
+    )
+    return hashlib.sha256(fingerprint_string.encode()).hexdigest()
+
 
 def compare_node_states(node_file_1, node_file_2):
     node_file_1 = pathlib.Path(node_file_1)
     node_file_2 = pathlib.Path(node_file_2)
 
+    if not (node_file_1.is_file() and node_file_2.is_file()):
+        return [False, "Node state file missing"]
+
     # Loading node json
     with open(node_file_1, "r") as f:
         node_1 = json.loads(f.read())["dependencies"]
@@ -88,4 +142,3 @@ def compare_node_states(node_file_1, node_file_2):
             return [False, "Parent node mismatch"]
 
     return [True, "OK"]
-
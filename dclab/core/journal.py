@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+from . import cache, utilities
+
+
+def static_file_digests(node):
+    return {
+        x: utilities.hash_file(x) if os.path.isfile(x) else ""
+        for x in node.list_dependent_static_files()
+    }
+
+
+def schedule_key(schedule):
+    # Changing the nodes, their configuration or their templates invalidates
+    # completed rows
+    key_string = json.dumps(
+        [
+            [node.name, cache.node_configuration(node), static_file_digests(node)]
+            for node in schedule
+        ],
+        sort_keys=True,
+        cls=utilities.JsonEncoder,
+    )
+    return hashlib.sha256(key_string.encode()).hexdigest()
+
+
+def row_key(state, schedule_key):
+    key_string = json.dumps(
+        {"state": dict(state), "schedule": schedule_key},
+        sort_keys=True,
+        cls=utilities.JsonEncoder,
+    )
+    return hashlib.sha256(key_string.encode()).hexdigest()
+
+
+class CompletionJournal(object):
+    # Outputs of completed rows, one JSON line appended after each row
+    def __init__(self, filename, fsync=True):
+        self.filename = pathlib.Path(filename)
+        # Without fsync a row may be lost on power failure, not on a crash
+        self.fsync = fsync
+
+    def reset(self):
+        if self.filename.exists():
+            self.filename.unlink()
+
+    def read(self):
+        entries = {}
+        if not self.filename.is_file():
+            return entries
+        with open(self.filename, "rb") as f:
+            for line in f:
+                # A row interrupted while being recorded is run again
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line.decode())
+                if "pickle" in entry:
+                    entry["output"] = pickle.loads(base64.b64decode(entry["pickle"]))
+                entries[entry["row"]] = entry
+        return entries
+
+    def record(self, index, key, output):
+        entry = {"row": int(index), "key": key}
+        try:
+            line = json.dumps({**entry, "output": output}, cls=utilities.JsonEncoder)
+        except (TypeError, ValueError):
+            # Outputs JSON cannot represent, e.g. DataFrames, are pickled
+            entry["pickle"] = base64.b64encode(pickle.dumps(output)).decode()
+            line = json.dumps(entry)
+        # A single append either writes the whole line or nothing usable
+        fd = os.open(str(self.filename), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + "\n").encode())
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
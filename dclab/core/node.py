@@ -1,30 +1,56 @@
 import copy
 import json
 import pathlib
-import pickle
 import os
 import numpy
-from . import dependency
-import fluxo.core.utilities
+from . import cache, dependency, storage
+import dclab.core.utilities
+
+# Attributes written while a node runs, they are reset for every row
+RUNTIME_ATTRIBUTES = (
+    "__internal_state__",
+    "node_output",
+    "output_files",
+    "output_manifest",
+)
 
 
 class Node(object):
+    # External tool run by the node, used to hand out license tokens
+    tool = None
+
     def __init__(self):
         self.__internal_state__ = {}
         self.parent_nodes = list()
         self.sim_dir = ""
         self.node_output = {}
         self.output_files = list()
+        self.output_manifest = None
         self.clean_up_output = False
         self.name = "Node"
+        self.fingerprint = ""
         return
 
     def save_state(self):
-        self.__internal_state__ = copy.deepcopy(self.__dict__)
+        # Snapshot of the configuration, outputs are never part of it
+        self.__internal_state__ = {
+            key: value
+            for key, value in self.__dict__.items()
+            if key not in RUNTIME_ATTRIBUTES
+        }
 
     def reset_state(self):
-        self.__dict__ = copy.deepcopy(self.__internal_state__)
-        self.save_state()
+        # Containers are copied shallowly so that changes made during a row do
+        # not leak into the snapshot, everything else is shared
+        state = {
+            key: copy.copy(value) if isinstance(value, (list, dict, set)) else value
+            for key, value in self.__internal_state__.items()
+        }
+        state["__internal_state__"] = self.__internal_state__
+        state["node_output"] = {}
+        state["output_files"] = list()
+        state["output_manifest"] = None
+        self.__dict__ = state
 
     def collect_dependencies(self):
         for key, obj in self.__dict__.items():
@@ -44,55 +70,94 @@ class Node(object):
     def output(self):
         return {}
 
+    def render_templates(self, states, directories):
+        # Command files of all rows can be rendered before the rows run, the
+        # directories are the folders of the node in each row
+        return
+
     def clean_up(self):
         if self.clean_up_output:
             for filename in self.output_files:
                 if os.path.isfile(filename):
                     os.remove(filename)
 
-    def assemble_parent_nodes(self):
+    def assemble_parent_nodes(self, recursive=True, visited=None):
+        # Shared ancestors are only visited once when assembling recursively
+        if visited is None:
+            visited = set()
+        visited.add(id(self))
         self.parent_nodes = list()
         for key, value in self.__dict__.items():
             if isinstance(value, dependency.Dependency):
                 self.parent_nodes.append(value.source_node)
-                value.source_node.assemble_parent_nodes()
+                if recursive and id(value.source_node) not in visited:
+                    value.source_node.assemble_parent_nodes(visited=visited)
 
     def get_node_outputs(self):
         return self.node_output
 
-    def save_node_to_disk(self, folder_name, state, dependencies_only=False):
+    def save_node_to_disk(
+        self, folder_name, state, dependencies_only=False, storage_backend="pickle"
+    ):
         folder_name = pathlib.Path(folder_name)
         output_filename = folder_name / "node_state.json"
-        ## Getting a list of all dependencies
-        dependencies = self.list_dependencies(state)
-        state_variables = dependencies["state_variables"]
-        ## Resolving the state variables to bake into the node state
-        ## Need to convert to 'object' to make sure it is serializable
-        variable_dict = {x: state.astype("object")[x] for x in state_variables}
-        dependencies["state_variables"] = variable_dict
+        dependencies = self.resolve_dependencies(state)
         output_dict = {
             "dependencies": dependencies,
+            "fingerprint": self.fingerprint,
         }
 
         if not dependencies_only:
             outputs = self.get_node_outputs()
-            output_file = folder_name / "outputs.pkl"
-            with open(output_file, "wb") as f:
-                f.write(pickle.dumps(outputs))
+            output_manifest = storage.save_outputs(
+                outputs, folder_name, backend=storage_backend
+            )
+            self.output_manifest = (output_manifest, str(folder_name))
             output_dict = {
                 **output_dict,
-                "node_output": str(output_file),
+                "node_output": output_manifest,
                 "output_files": self.output_files,
             }
 
         output_string = json.dumps(
-            output_dict, indent=3, cls=fluxo.core.utilities.JsonEncoder
+            output_dict, indent=3, cls=dclab.core.utilities.JsonEncoder
         )
         with open(output_filename, "w") as f:
             f.write(output_string)
         return output_filename
 
-    def load_node_from_disk(self, folder_name):
+    def resolve_dependencies(self, state):
+        ## Getting a list of all dependencies
+        dependencies = self.list_dependencies(state)
+        state_variables = dependencies["state_variables"]
+        ## Resolving the state variables to bake into the node state
+        ## Need to convert to 'object' to make sure it is serializable
+        object_state = state.astype("object")
+        variable_dict = {x: object_state[x] for x in state_variables}
+        dependencies["state_variables"] = variable_dict
+        return dependencies
+
+    def compute_fingerprint(self, state, parent_fingerprints):
+        # The type and configuration tell parents with the same inputs apart
+        self.fingerprint = dependency.fingerprint_dependencies(
+            self.resolve_dependencies(state),
+            parent_fingerprints,
+            configuration=cache.node_configuration(self),
+            sources=self.list_dependency_sources(),
+        )
+        return self.fingerprint
+
+    def list_dependency_sources(self):
+        # Parent node and output read by each attribute holding a dependency,
+        # taken from the snapshot since collected dependencies hold values
+        attributes = self.__internal_state__ or self.__dict__
+        return {
+            key: {"node": value.source_node.name, **value.configuration()}
+            for key, value in attributes.items()
+            if isinstance(value, dependency.Dependency)
+        }
+
+    def load_node_from_disk(self, folder_name, columns=None):
         folder_name = pathlib.Path(folder_name)
         import_filename = folder_name / "node_state.json"
         with open(import_filename, "r") as f:
@@ -100,9 +165,28 @@ class Node(object):
 
         node_state = json.loads(import_string)
         self.output_files = node_state["output_files"]
-        node_output_file = node_state["node_output"]
-        with open(node_output_file, "rb") as f:
-            self.node_output = pickle.loads(f.read())
+        # Outputs are only read once a dependent node accesses them
+        self.node_output = storage.LazyOutputs(
+            node_state["node_output"], folder_name, columns=columns
+        )
+
+    def release_node_output(self):
+        # Frees outputs held in memory, they are read again from disk on access
+        if isinstance(self.node_output, storage.LazyOutputs):
+            self.node_output.release()
+        elif self.output_manifest is not None:
+            self.node_output = storage.LazyOutputs(*self.output_manifest)
+        if not self.__internal_state__:
+            return
+        # Data kept in attributes while running, e.g. parsed files, is dropped
+        # and collected dependencies are put back as in the snapshot
+        for key in list(self.__dict__):
+            if key in RUNTIME_ATTRIBUTES:
+                continue
+            if key not in self.__internal_state__:
+                del self.__dict__[key]
+            elif isinstance(self.__internal_state__[key], dependency.Dependency):
+                self.__dict__[key] = self.__internal_state__[key]
 
     def list_dependent_nodes(self):
         return [x.name for x in self.parent_nodes]
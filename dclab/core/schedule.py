@@ -1,43 +1,66 @@
+import collections
+import concurrent.futures
 from itertools import compress
 import tabulate
 
 
-def add_node_to_schedule(node, schedule):
-    if node in schedule:
-        schedule.remove(node)
-    schedule.insert(0, node)
+class ScheduleError(Exception):
+    pass
 
 
-def add_node_and_parents_to_schedule(node, schedule, node_list):
-    # Add node
-    add_node_to_schedule(node, schedule)
-    node.assemble_parent_nodes()
-    # Add parents
-    for parents in node.parent_nodes:
-        add_node_and_parents_to_schedule(parents, schedule, node_list)
+def collect_nodes(node_list):
+    # Node list extended by all (hidden) parent nodes, each node appears once
+    nodes = list()
+    visited = set()
+    stack = list(reversed(node_list))
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        nodes.append(node)
+        node.assemble_parent_nodes(recursive=False)
+        stack.extend(reversed(node.parent_nodes))
+    return nodes
 
 
 def get_tail_nodes(node_list):
-    has_no_children = [True] * len(node_list)
-
-    for i in range(len(node_list)):
-        current_node = node_list[i]
-
-        for j in range(len(node_list)):
-            if current_node in node_list[j].parent_nodes:
-                has_no_children[i] = False
-
+    parent_ids = set(id(parent) for node in node_list for parent in node.parent_nodes)
+    has_no_children = [id(node) not in parent_ids for node in node_list]
     end_point_list = list(compress(node_list, has_no_children))
     return end_point_list
 
 
 def extract_schedule_from_node_list(node_list):
-    schedule = list()
-    end_point_list = get_tail_nodes(node_list)
-
-    for end_point in end_point_list:
-        add_node_and_parents_to_schedule(end_point, schedule, node_list)
+    # Kahn's algorithm, ties are resolved by the order of the node list
+    nodes = collect_nodes(node_list)
+    remaining_parents = {}
+    children = collections.defaultdict(list)
+    for node in nodes:
+        parent_ids = set(id(parent) for parent in node.parent_nodes)
+        remaining_parents[id(node)] = len(parent_ids)
+        for parent_id in parent_ids:
+            children[parent_id].append(node)
 
+    schedule = list()
+    ready = collections.deque(x for x in nodes if remaining_parents[id(x)] == 0)
+    while ready:
+        node = ready.popleft()
+        schedule.append(node)
+        for child in children[id(node)]:
+            remaining_parents[id(child)] -= 1
+            if remaining_parents[id(child)] == 0:
+                ready.append(child)
+
+    if len(schedule) < len(nodes):
+        cyclic_nodes = [x for x in nodes if remaining_parents[id(x)] > 0]
+        raise ScheduleError(
+            "Cyclic dependency between nodes: {}".format(
+                ", ".join(
+                    "{} ({})".format(type(x).__name__, x.name) for x in cyclic_nodes
+                )
+            )
+        )
     return schedule
 
 
@@ -54,10 +77,49 @@ def schedule_to_string(schedule):
 
 
 def schedule_consistency_check(schedule):
+    positions = {id(node): i for i, node in enumerate(schedule)}
     for i, node in enumerate(schedule):
         node_parents = node.parent_nodes
         for parent_node in node_parents:
-            schedule_index = schedule.index(parent_node)
-            if not schedule_index < i:
+            schedule_index = positions.get(id(parent_node))
+            if schedule_index is None or not schedule_index < i:
                 return False
     return True
+
+
+def extract_dependency_graph(schedule):
+    # Parent positions for each node in the schedule
+    positions = {id(node): i for i, node in enumerate(schedule)}
+    return [
+        sorted(set(positions[id(parent)] for parent in node.parent_nodes))
+        for node in schedule
+    ]
+
+
+def run_graph_in_parallel(dependency_graph, run_function, max_workers=None):
+    # Dispatches every node whose parents are done, results are in graph order
+    remaining_parents = [len(parents) for parents in dependency_graph]
+    children = [list() for _ in dependency_graph]
+    for node_id, parents in enumerate(dependency_graph):
+        for parent_id in parents:
+            children[parent_id].append(node_id)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(run_function, node_id): node_id
+            for node_id, n_parents in enumerate(remaining_parents)
+            if n_parents == 0
+        }
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                node_id = pending.pop(future)
+                results[node_id] = future.result()
+                for child_id in children[node_id]:
+                    remaining_parents[child_id] -= 1
+                    if remaining_parents[child_id] == 0:
+                        pending[executor.submit(run_function, child_id)] = child_id
+    return [results[node_id] for node_id in range(len(dependency_graph))]
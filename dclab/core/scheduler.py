@@ -0,0 +1,172 @@
+import concurrent.futures
+import heapq
+import threading
+import time
+
+PRIORITIES = ("critical_path", "shortest_runtime")
+
+
+class LicensePool(object):
+    # Token counter per tool, tools without a limit are not restricted
+    def __init__(self, limits=None):
+        self.limits = dict(limits or {})
+        self.in_use = {tool: 0 for tool in self.limits}
+        self.__lock = threading.Lock()
+
+    def try_acquire(self, tool):
+        if tool not in self.limits:
+            return True
+        with self.__lock:
+            if self.in_use[tool] >= self.limits[tool]:
+                return False
+            self.in_use[tool] += 1
+            return True
+
+    def release(self, tool):
+        if tool not in self.limits:
+            return
+        with self.__lock:
+            self.in_use[tool] -= 1
+
+    def total(self):
+        return sum(self.limits.values())
+
+
+def critical_path_lengths(dependency_graph, weights=None):
+    # Longest weighted path from each node to the end of the graph. Parents
+    # always come before their children, so one reverse pass is enough.
+    if weights is None:
+        weights = [1.0] * len(dependency_graph)
+    children = [list() for _ in dependency_graph]
+    for node_id, parents in enumerate(dependency_graph):
+        for parent_id in parents:
+            children[parent_id].append(node_id)
+    lengths = [0.0] * len(dependency_graph)
+    for node_id in reversed(range(len(dependency_graph))):
+        lengths[node_id] = weights[node_id] + max(
+            [lengths[x] for x in children[node_id]], default=0.0
+        )
+    return lengths
+
+
+class JobScheduler(object):
+    def __init__(
+        self,
+        dependency_graph,
+        tools=None,
+        license_pool=None,
+        max_workers=1,
+        priority="critical_path",
+        expected_runtimes=None,
+        max_active_rows=None,
+        poll_interval=1.0,
+    ):
+        self.dependency_graph = dependency_graph
+        if tools is None:
+            tools = [None] * len(dependency_graph)
+        self.tools = list(tools)
+        if license_pool is None:
+            license_pool = LicensePool()
+        self.license_pool = license_pool
+        self.max_workers = max_workers
+        # Rows are started lazily, only their nodes have to be kept in memory
+        if max_active_rows is None:
+            max_active_rows = 2 * max_workers
+        self.max_active_rows = max_active_rows
+        # Waiting time before asking the license pool again if nothing runs
+        self.poll_interval = poll_interval
+
+        # Expected runtimes are given per tool, nodes without a tool count as 1
+        if expected_runtimes is None:
+            expected_runtimes = {}
+        runtimes = [expected_runtimes.get(tool, 1.0) for tool in self.tools]
+        if priority == "critical_path":
+            # Nodes with the longest chain of work behind them start first
+            self.priorities = [
+                -x for x in critical_path_lengths(dependency_graph, runtimes)
+            ]
+        elif priority == "shortest_runtime":
+            self.priorities = runtimes
+        else:
+            raise ValueError(
+                "Unknown priority {}, choose from {}".format(
+                    priority, ", ".join(PRIORITIES)
+                )
+            )
+        self.children = [list() for _ in dependency_graph]
+        for node_id, parents in enumerate(dependency_graph):
+            for parent_id in parents:
+                self.children[parent_id].append(node_id)
+
+    def run(self, n_rows, start_row, finish_row):
+        # start_row(row_id) returns the function running a node of that row,
+        # finish_row(row_id, outputs) gets the node outputs in graph order.
+        # Both are called from the thread calling run.
+        ready = list()
+        rows = {}
+        running = {}
+        next_row = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            while True:
+                while next_row < n_rows and len(rows) < self.max_active_rows:
+                    self.__start_row(next_row, start_row, finish_row, rows, ready)
+                    next_row += 1
+                self.__dispatch(ready, running, rows, executor)
+                if not running:
+                    if not ready and next_row == n_rows:
+                        break
+                    # All ready nodes wait for tokens held outside this pool
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = concurrent.futures.wait(
+                    running,
+                    timeout=self.poll_interval if ready else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    row_id, node_id = running.pop(future)
+                    self.license_pool.release(self.tools[node_id])
+                    row = rows[row_id]
+                    row["results"][node_id] = future.result()
+                    for child_id in self.children[node_id]:
+                        row["remaining_parents"][child_id] -= 1
+                        if row["remaining_parents"][child_id] == 0:
+                            self.__push(ready, row_id, child_id)
+                    if len(row["results"]) == len(self.dependency_graph):
+                        self.__finish_row(row_id, finish_row, rows)
+
+    def __start_row(self, row_id, start_row, finish_row, rows, ready):
+        rows[row_id] = {
+            "run": start_row(row_id),
+            "remaining_parents": [len(x) for x in self.dependency_graph],
+            "results": {},
+        }
+        if not self.dependency_graph:
+            self.__finish_row(row_id, finish_row, rows)
+        for node_id, parents in enumerate(self.dependency_graph):
+            if not parents:
+                self.__push(ready, row_id, node_id)
+
+    def __finish_row(self, row_id, finish_row, rows):
+        results = rows.pop(row_id)["results"]
+        finish_row(row_id, [results[x] for x in range(len(self.dependency_graph))])
+
+    def __push(self, ready, row_id, node_id):
+        # Ties are broken by row so that early rows finish first
+        heapq.heappush(ready, (self.priorities[node_id], row_id, node_id))
+
+    def __dispatch(self, ready, running, rows, executor):
+        # Starts the most urgent nodes a token is available for
+        blocked = list()
+        while ready and len(running) < self.max_workers:
+            job = heapq.heappop(ready)
+            _, row_id, node_id = job
+            if self.license_pool.try_acquire(self.tools[node_id]):
+                future = executor.submit(rows[row_id]["run"], node_id)
+                running[future] = (row_id, node_id)
+            else:
+                blocked.append(job)
+        for job in blocked:
+            heapq.heappush(ready, job)
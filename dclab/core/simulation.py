@@ -1,13 +1,35 @@
+import concurrent.futures
 import copy
+import functools
 import os
 import pathlib
 import shutil
+import threading
+import time
 import pandas as pd
 from .. import core
-from dclab.core import data, schedule, dependency
+from dclab.core import cache, data, journal, schedule, scheduler
+from dclab.core import storage, trace
 from dclab import __version__ as fluxo_version
 
 
+def run_directory(simulation_directory, index):
+    return simulation_directory + os.sep + "run_" + str(index) + os.sep
+
+
+# Simulation of a worker process, set once when the process pool starts
+_worker_simulation = None
+
+
+def _initialize_worker(simulation):
+    global _worker_simulation
+    _worker_simulation = simulation
+
+
+def _run_worker_row(state_id, state):
+    return _worker_simulation.run_row(state_id=state_id, state=state)
+
+
 class Simulation(object):
     def __init__(
         self,
@@ -19,9 +41,26 @@ class Simulation(object):
         frequent_output=True,
         allow_execution_skipping=True,
         output_filename="output.csv",
+        max_workers=1,
+        executor=None,
+        cache_directory=None,
+        cache_max_size=None,
+        max_node_workers=1,
+        storage_backend="pickle",
+        license_limits=None,
+        scheduling_priority="critical_path",
+        expected_runtimes=None,
+        instrumentation=False,
+        doe_chunk_size=None,
+        resume=False,
+        deduplicate_outputs=False,
     ):
-        # Initialize simulation state
-        initial_state = data.SimulationMemory()
+        # Initialize simulation state, large DOEs can be read in chunks
+        self.streaming = doe_chunk_size is not None
+        if self.streaming:
+            initial_state = data.StreamingSimulationMemory(chunk_size=doe_chunk_size)
+        else:
+            initial_state = data.SimulationMemory()
         initial_state.load_defaults(defaults_filename)
         if doe_filename:
             initial_state.load_doe(doe_filename)
@@ -47,16 +86,53 @@ class Simulation(object):
 
         base_directory = simulation_directory + os.sep + simulation_name
         self.base_directory = pathlib.Path(base_directory)
+        # Resuming needs the results of the previous run
+        self.resume = resume
         self.__generate_simulation_directory(
-            simulation_directory=base_directory, clean_slate=clean_slate
+            simulation_directory=base_directory, clean_slate=clean_slate and not resume
         )
 
         self.nodes = list()
         self.schedule = list()
+        self.dependency_graph = list()
         self.output_frame = pd.DataFrame()
         self.frequent_output = frequent_output
         self.output_filename = self.base_directory / output_filename
+        self.output_rows = {}
+        self.result_writer = data.ResultWriter(self.output_filename)
+        # DataFrame outputs and the results table can be stored in columnar files
+        self.storage_backend = storage.get_backend(storage_backend)
         self.allow_execution_skipping = allow_execution_skipping
+        # DOE rows are independent and can be run in separate processes
+        self.max_workers = max_workers
+        self.executor = executor
+        # Independent branches of the node graph can run in separate threads
+        self.max_node_workers = max_node_workers
+        # Completed nodes are indexed by their dependency fingerprint
+        self.node_index = cache.NodeIndex(self.base_directory / "node_index.jsonl")
+        # Optional cache shared between simulations
+        self.result_cache = None
+        if cache_directory is not None:
+            self.result_cache = cache.ResultCache(
+                cache_directory, max_size=cache_max_size
+            )
+        # With license limits, nodes of all rows share one queue of tool tokens
+        self.license_pool = None
+        if license_limits is not None:
+            self.license_pool = scheduler.LicensePool(license_limits)
+        self.scheduling_priority = scheduling_priority
+        self.expected_runtimes = expected_runtimes
+        # Timing, memory and I/O of every node and row, next to schedule.txt
+        self.tracer = trace.Tracer(
+            self.base_directory / "trace.jsonl" if instrumentation else None
+        )
+        # Outputs of completed rows, always written and read back when resuming
+        self.journal = journal.CompletionJournal(self.base_directory / "journal.jsonl")
+        self.schedule_key = ""
+        # Output files and stored outputs are kept once per content
+        self.object_store = None
+        if deduplicate_outputs:
+            self.object_store = cache.ObjectStore(self.base_directory / "object_store")
 
     def __generate_simulation_directory(self, simulation_directory, clean_slate):
 
@@ -66,15 +142,20 @@ class Simulation(object):
         if not os.path.exists(simulation_directory):
             os.mkdir(simulation_directory)
         self.state.add_data_to_all_rows(name="base_dir", data=simulation_directory)
-        # Simulation directories
-        for i in range(self.state.size()):
-            current_row = self.state.get_row(i)
-            current_folder = current_row.base_dir + os.sep + "run_" + str(i)
+        # Simulation directories, streamed rows get theirs when they run
+        if self.streaming:
+            self.state.set_column(
+                name="sim_dir",
+                data=functools.partial(run_directory, simulation_directory),
+            )
+            return
+        folders = [
+            run_directory(simulation_directory, i) for i in range(self.state.size())
+        ]
+        for current_folder in folders:
             if not os.path.exists(current_folder):
                 os.mkdir(current_folder)
-            self.state.add_data_at_index(
-                name="sim_dir", data=current_folder + os.sep, index=i
-            )
+        self.state.set_column(name="sim_dir", data=folders)
 
     def add_node(self, nodes):
         if isinstance(nodes, list):
@@ -89,16 +170,13 @@ class Simulation(object):
 
     def assemble_parents_and_find_hidden_nodes(self, node):
 
-        if node not in self.nodes:
-            self.nodes.append(node)
-        node.assemble_parent_nodes()
-        for parent in node.parent_nodes:
-            self.assemble_parents_and_find_hidden_nodes(parent)
+        known_nodes = set(id(x) for x in self.nodes)
+        for hidden_node in schedule.collect_nodes([node]):
+            if id(hidden_node) not in known_nodes:
+                self.nodes.append(hidden_node)
 
     def assemble_schedule(self):
-        initial_nodes_list = copy.copy(self.nodes)
-        for node in initial_nodes_list:
-            self.assemble_parents_and_find_hidden_nodes(node)
+        self.nodes = schedule.collect_nodes(self.nodes)
         current_schedule = schedule.extract_schedule_from_node_list(self.nodes)
         self.schedule = current_schedule
         schedule_string = schedule.schedule_to_string(self.schedule)
@@ -111,26 +189,15 @@ class Simulation(object):
         if schedule_consistency:
             print("Schedule consistency check: Passed")
         else:
-            print("Schedule consistency check: Failed")
-            exit(1)
+            raise schedule.ScheduleError("Schedule consistency check: Failed")
 
         ## Writing unique node names based on schedule ID
         for node_id, node in enumerate(self.schedule):
             node.name = "{:02d}_{}".format(node_id, type(node).__name__)
+        self.dependency_graph = schedule.extract_dependency_graph(self.schedule)
 
     def find_matching_nodes(self, node, state_id):
-        ids = range(state_id - 1, -1, -1)
-        current_node_path = pathlib.Path(
-            self.state.get_row(state_id).sim_dir
-        ) / "{}/node_state.json".format(node.name)
-        for row_id in ids:
-            foreign_node_path = pathlib.Path(
-                self.state.get_row(row_id).sim_dir
-            ) / "{}/node_state.json".format(node.name)
-            match = dependency.compare_node_states(current_node_path, foreign_node_path)
-            if match[0]:
-                return foreign_node_path
-        return None
+        return self.node_index.lookup(node.name, node.fingerprint)
 
     def run_simulation(self):
 
@@ -138,48 +205,398 @@ class Simulation(object):
         for node in self.nodes:
             node.save_state()
         self.output_frame = pd.DataFrame()
+        self.output_rows = {}
+        if self.frequent_output or self.streaming:
+            self.result_writer.reset()
+        self.tracer.reset()
+        pending_rows = self.__restore_completed_rows()
+        with self.tracer.span("render_templates", "io"):
+            self.__render_templates(pending_rows)
         # Loop through DOE list
+        if self.license_pool is not None:
+            self.__run_rows_with_scheduler(pending_rows)
+        elif self.executor is None and self.max_workers == 1:
+            for i in pending_rows:
+                state = self.state.get_row(index=i)
+                output = self.__run_schedule_with_state(state_id=i, state=state)
+                self.__add_row_to_output(state_id=i, output=output, state=state)
+        else:
+            self.__run_rows_in_parallel(pending_rows)
+        # Rows are assembled into a frame once all of them have finished,
+        # streamed results stay in output.csv and are read with load_results
+        if not self.streaming:
+            with self.tracer.span("finalize_results", "export"):
+                if self.frequent_output:
+                    self.result_writer.finalize()
+                self.output_frame = pd.DataFrame.from_dict(
+                    self.output_rows, orient="index"
+                ).sort_index()
+                self.output_rows = {}
+            # Written with every backend so that load_results finds the table
+            with self.tracer.span("export_results", "export"):
+                self.export_results(self.results_filename())
+        if self.object_store is not None:
+            with self.tracer.span("collect_garbage", "io"):
+                self.collect_garbage()
+        if self.tracer.enabled():
+            self.write_report()
+
+    def __restore_completed_rows(self):
+        # Rows finished by an earlier run with the same state and nodes are
+        # added to the results from the journal, the others are returned
+        self.schedule_key = journal.schedule_key(self.schedule)
+        if not self.resume:
+            self.journal.reset()
+            return list(range(self.num_sims()))
+        completed_rows = self.journal.read()
+        pending_rows = list()
         for i in range(self.num_sims()):
-            current_state = self.state.get_row(index=i)
-            output = self.__run_schedule_with_state(state_id=i)
-            new_row = pd.DataFrame(data={**current_state, **output}, index=list([i]))
-            self.output_frame = pd.concat([self.output_frame, new_row])
-            if self.frequent_output:
-                self.export_results_to_csv(self.output_filename)
-
-    def __run_schedule_with_state(self, state_id):
-        state = self.state.get_row(index=state_id)
-        row_output = {}
-        for node_id, node in enumerate(self.schedule):
-            folder_name = node.name
-            node_sim_dir = pathlib.Path(state.sim_dir) / folder_name
-            node_sim_dir.mkdir(parents=True, exist_ok=True)
+            entry = completed_rows.get(i)
+            if entry is not None:
+                state = self.state.get_row(index=i)
+                if entry["key"] == journal.row_key(state, self.schedule_key):
+                    self.__add_row_to_output(
+                        state_id=i, output=entry["output"], state=state, record=False
+                    )
+                    continue
+            pending_rows.append(i)
+        print(
+            "Resuming: {} of {} rows completed".format(
+                self.num_sims() - len(pending_rows), self.num_sims()
+            )
+        )
+        return pending_rows
 
-            node.reset_state()
-            node.collect_dependencies()
-            node.sim_dir = str(node_sim_dir) + os.sep
-            current_node_state = node.save_node_to_disk(
-                node_sim_dir, state, dependencies_only=True
+    def __render_templates(self, pending_rows):
+        # Command files of all rows are rendered in one pass before the rows
+        # run, streamed rows only get their folders when they run
+        nodes = [
+            x
+            for x in self.schedule
+            if type(x).render_templates is not core.Node.render_templates
+        ]
+        if self.streaming or not nodes:
+            return
+        states = [self.state.get_row(index=i) for i in pending_rows]
+        for node in nodes:
+            directories = [pathlib.Path(x.sim_dir) / node.name for x in states]
+            node.render_templates(states, directories)
+
+    def collect_garbage(self):
+        # Objects whose run files were all removed, e.g. by Node.clean_up
+        if self.object_store is None:
+            return 0, 0
+        return self.object_store.collect()
+
+    def write_report(self):
+        report_string = trace.summary_to_string(trace.load_trace(self.tracer.filename))
+        print(report_string)
+        with open(self.base_directory / "report.txt", "w") as f:
+            f.write(report_string)
+
+    def __run_rows_in_parallel(self, pending_rows):
+        executor = self.executor
+        run_row = self.run_row
+        if not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            # Other executors, e.g. thread pools, may run rows side by side on
+            # the same node instances
+            run_row = functools.partial(self.run_row, copy_nodes=True)
+        if executor is None:
+            # The simulation is sent to every worker once instead of with
+            # every row, only row IDs and states are sent along afterwards
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_initialize_worker,
+                initargs=(self,),
+            )
+            run_row = _run_worker_row
+        # Streamed rows are submitted a few at a time and released when done
+        max_pending = len(pending_rows)
+        if self.streaming:
+            max_pending = 2 * self.max_workers
+        try:
+            pending = {}
+            rows = iter(pending_rows)
+            next_row = next(rows, None)
+            while next_row is not None or pending:
+                while next_row is not None and len(pending) < max_pending:
+                    # Rows are sent along so that workers do not read the DOE
+                    state = self.state.get_row(index=next_row)
+                    future = executor.submit(run_row, next_row, state)
+                    pending[future] = (next_row, state)
+                    next_row = next(rows, None)
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                # Rows are exported as they finish and sorted by ID at the end
+                for future in done:
+                    state_id, state = pending.pop(future)
+                    self.__add_row_to_output(
+                        state_id=state_id, output=future.result(), state=state
+                    )
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+
+    def __run_rows_with_scheduler(self, pending_rows):
+        # Every row gets its own copy of the nodes since rows run concurrently
+        row_nodes = {}
+        row_states = {}
+        row_start = {}
+
+        def start_row(row_id):
+            state_id = pending_rows[row_id]
+            row_start[state_id] = time.time()
+            row_nodes[state_id] = copy.deepcopy(self.schedule)
+            row_states[state_id] = self.state.get_row(index=state_id)
+            return self.__row_node_runner(
+                state_id, row_nodes[state_id], state=row_states[state_id]
+            )
+
+        def finish_row(row_id, node_outputs):
+            state_id = pending_rows[row_id]
+            output = self.__merge_row_outputs(row_nodes.pop(state_id), node_outputs)
+            self.__add_row_to_output(
+                state_id=state_id, output=output, state=row_states.pop(state_id)
+            )
+            start = row_start.pop(state_id)
+            # Rows overlap here, so only their time span is recorded
+            self.tracer.record(
+                "row", "row", start, time.time() - start, {"row": state_id}
+            )
+
+        # Enough workers to keep every license busy besides tool-free nodes
+        max_workers = max(self.max_node_workers, self.license_pool.total() + 1)
+        job_scheduler = scheduler.JobScheduler(
+            self.dependency_graph,
+            tools=[node.tool for node in self.schedule],
+            license_pool=self.license_pool,
+            max_workers=max_workers,
+            priority=self.scheduling_priority,
+            expected_runtimes=self.expected_runtimes,
+        )
+        job_scheduler.run(len(pending_rows), start_row, finish_row)
+
+    def __add_row_to_output(self, state_id, output, state=None, record=True):
+        current_state = state
+        if current_state is None:
+            current_state = self.state.get_row(index=state_id)
+        new_row = {**current_state, **output}
+        if self.frequent_output or self.streaming:
+            # Only the new row is appended, output.csv is never rewritten
+            with self.tracer.span("add_row_to_output", "export", row=state_id):
+                self.result_writer.append(index=state_id, row=new_row)
+        # The results frame is built from the rows themselves, not from the csv
+        # file, so that values keep their types. Streamed rows are not kept.
+        if not self.streaming:
+            self.output_rows[state_id] = new_row
+        # Every finished row is recorded so that an interrupted run can be resumed
+        if record:
+            self.journal.record(
+                state_id, journal.row_key(current_state, self.schedule_key), output
             )
-            matching_node = self.find_matching_nodes(node, state_id)
-            if self.allow_execution_skipping and not (matching_node == None):
-                node.load_node_from_disk(matching_node.parent)
+
+    def run_row(self, state_id, state=None, copy_nodes=False):
+        # Public entry point so that rows can be sent to worker processes. Rows
+        # running concurrently in one process need their own copy of the nodes.
+        nodes = self.schedule
+        if copy_nodes:
+            nodes = copy.deepcopy(self.schedule)
+        return self.__run_schedule_with_state(
+            state_id=state_id, state=state, nodes=nodes
+        )
+
+    def __run_schedule_with_state(self, state_id, state=None, nodes=None):
+        if nodes is None:
+            nodes = self.schedule
+        with self.tracer.span("row", "row", row=state_id):
+            run_node = self.__row_node_runner(state_id, nodes, state=state)
+            if self.max_node_workers == 1:
+                node_outputs = [run_node(node_id) for node_id in range(len(nodes))]
             else:
-                node.initialize(state)
-                node.run()
+                node_outputs = schedule.run_graph_in_parallel(
+                    self.dependency_graph, run_node, max_workers=self.max_node_workers
+                )
+            return self.__merge_row_outputs(nodes, node_outputs)
 
-            node.save_node_to_disk(node_sim_dir, state)
-            node_output = node.output()
-            if not node_output:
-                node_output = {}
+    def __row_node_runner(self, state_id, nodes, state=None):
+        # Function running a single node of the given row by its schedule ID
+        if state is None:
+            state = self.state.get_row(index=state_id)
+        # Run directories are created just before the row runs
+        os.makedirs(state.sim_dir, exist_ok=True)
+        # Number of nodes that still have to read each node's outputs
+        remaining_consumers = [0] * len(nodes)
+        for parents in self.dependency_graph:
+            for parent_id in parents:
+                remaining_consumers[parent_id] += 1
+        return functools.partial(
+            self.__run_node_with_state,
+            nodes=nodes,
+            state=state,
+            state_id=state_id,
+            row_fingerprints={},
+            remaining_consumers=remaining_consumers,
+            release_lock=threading.Lock(),
+        )
+
+    @staticmethod
+    def __merge_row_outputs(nodes, node_outputs):
+        row_output = {}
+        # Outputs are merged in schedule order independent of completion order
+        for node_output in node_outputs:
             row_output.update(node_output)
-        for row in self.schedule:
+        for row in nodes:
             row.clean_up()
         return row_output
 
+    def __run_node_with_state(
+        self,
+        node_id,
+        nodes,
+        state,
+        state_id,
+        row_fingerprints,
+        remaining_consumers,
+        release_lock,
+    ):
+        node = nodes[node_id]
+        with self.tracer.span(
+            node.name, "node", row=state_id, type=type(node).__name__, tool=node.tool
+        ) as trace_args:
+            node_output = self.__process_node(
+                node, state, state_id, row_fingerprints, trace_args
+            )
+        self.__release_node_outputs(node_id, nodes, remaining_consumers, release_lock)
+        return node_output
+
+    def __process_node(self, node, state, state_id, row_fingerprints, trace_args):
+        folder_name = node.name
+        node_sim_dir = pathlib.Path(state.sim_dir) / folder_name
+        node_sim_dir.mkdir(parents=True, exist_ok=True)
+
+        node.reset_state()
+        node.collect_dependencies()
+        node.sim_dir = str(node_sim_dir) + os.sep
+        row_fingerprints[node.name] = node.compute_fingerprint(state, row_fingerprints)
+        # Where the results came from: earlier rows, the shared cache or a run
+        trace_args["cache"] = "miss"
+        matching_node = None
+        if self.allow_execution_skipping:
+            with self.tracer.span("find_matching_nodes", "cache", row=state_id):
+                matching_node = self.find_matching_nodes(node, state_id)
+        if matching_node is None or matching_node.parent != node_sim_dir:
+            # Index entries of an earlier run in this folder become invalid
+            node_state_file = node_sim_dir / "node_state.json"
+            if node_state_file.is_file():
+                node_state_file.unlink()
+            # Results of an earlier run in this folder are links to shared objects
+            if self.object_store is not None:
+                self.object_store.detach(node_sim_dir)
+        if matching_node is not None:
+            node.load_node_from_disk(matching_node.parent)
+            trace_args["cache"] = "index"
+        elif self.allow_execution_skipping:
+            with self.tracer.span("restore_from_cache", "cache", row=state_id):
+                if self.__restore_from_cache(node, node_sim_dir):
+                    trace_args["cache"] = "cache"
+        node_executed = trace_args["cache"] == "miss"
+        if node_executed:
+            with self.tracer.span(
+                "run_{}".format(node.tool or type(node).__name__), "tool", row=state_id,
+            ):
+                node.initialize(state)
+                node.run()
+
+        with self.tracer.span("save_node_to_disk", "io", row=state_id):
+            current_node_state = node.save_node_to_disk(
+                node_sim_dir, state, storage_backend=self.storage_backend
+            )
+        if node_executed and self.result_cache is not None:
+            with self.tracer.span("store_in_cache", "cache", row=state_id):
+                self.result_cache.store(node, node_sim_dir)
+        if self.object_store is not None:
+            with self.tracer.span("deduplicate_outputs", "io", row=state_id):
+                self.object_store.add_files(self.__stored_files(node, node_sim_dir))
+        self.node_index.add(node.name, node.fingerprint, current_node_state)
+        node_output = node.output()
+        if not node_output:
+            node_output = {}
+        return node_output
+
+    @staticmethod
+    def __stored_files(node, node_sim_dir):
+        # Saved outputs and output files written to the node folder
+        filenames = [
+            str(node_sim_dir / x)
+            for x in storage.list_output_files(node.output_manifest[0])
+        ]
+        for filename in node.output_files:
+            if os.path.dirname(filename) == str(node_sim_dir):
+                filenames.append(filename)
+        return sorted(set(filenames))
+
+    def __release_node_outputs(self, node_id, nodes, remaining_consumers, release_lock):
+        # Outputs are released once the last node reading them has run
+        released_nodes = list()
+        with release_lock:
+            if remaining_consumers[node_id] == 0:
+                released_nodes.append(node_id)
+            for parent_id in self.dependency_graph[node_id]:
+                remaining_consumers[parent_id] -= 1
+                if remaining_consumers[parent_id] == 0:
+                    released_nodes.append(parent_id)
+        for released_id in released_nodes:
+            nodes[released_id].release_node_output()
+
+    def __restore_from_cache(self, node, node_sim_dir):
+        if self.result_cache is None:
+            return False
+        return self.result_cache.restore(node, node_sim_dir)
+
     def export_results_to_csv(self, filename):
         self.output_frame.to_csv(path_or_buf=filename, index_label="id")
 
+    def results_filename(self):
+        return self.output_filename.with_suffix(self.storage_backend.extension)
+
+    def export_results(self, filename):
+        # The row ID is stored as a column since not all formats keep the index
+        output_frame = self.output_frame
+        if self.streaming:
+            output_frame = self.load_results()
+        output_frame = output_frame.rename_axis("id").reset_index()
+        output_frame.columns = [str(x) for x in output_frame.columns]
+        self.storage_backend.write(output_frame, filename)
+
+    def load_results(self, filename=None, columns=None):
+        # A whole sweep is reloaded with a single read of the results table
+        if filename is None and self.streaming:
+            return self.__load_streamed_results(columns)
+        if filename is None:
+            filename = self.results_filename()
+        if columns is not None:
+            columns = ["id"] + [x for x in columns if not x == "id"]
+        output_frame = self.storage_backend.read(filename, columns=columns)
+        return output_frame.set_index("id")
+
+    def __load_streamed_results(self, columns=None):
+        # Streamed rows are appended to output.csv as they finish, in any order
+        if not self.output_filename.exists():
+            return pd.DataFrame()
+        usecols = None
+        if columns is not None:
+            names = pd.read_csv(self.output_filename, nrows=0).columns
+            usecols = ["id"] + [x for x in columns if x in names and not x == "id"]
+        output_frame = pd.read_csv(self.output_filename, usecols=usecols)
+        return output_frame.set_index("id").sort_index()
+
+    def __getstate__(self):
+        # Executors cannot be sent to worker processes
+        state = self.__dict__.copy()
+        state["executor"] = None
+        return state
+
     def __add__(self, other):
         if isinstance(other, core.Node) or isinstance(other, list):
             self.add_node(other)
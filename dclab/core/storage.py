@@ -0,0 +1,280 @@
+import collections.abc
+import importlib.util
+import pathlib
+import pickle
+import shutil
+import pandas as pd
+
+
+class PickleBackend(object):
+    name = "pickle"
+    extension = ".pkl"
+    requires = None
+
+    def supports(self, obj):
+        return True
+
+    def write(self, obj, filename):
+        with open(filename, "wb") as f:
+            f.write(pickle.dumps(obj))
+
+    def read(self, filename, columns=None):
+        with open(filename, "rb") as f:
+            obj = pickle.loads(f.read())
+        if columns is not None and isinstance(obj, pd.DataFrame):
+            obj = obj[[x for x in columns if x in obj.columns]]
+        return obj
+
+
+class ParquetBackend(PickleBackend):
+    name = "parquet"
+    extension = ".parquet"
+    requires = "pyarrow"
+
+    def __init__(self, compression="snappy"):
+        self.compression = compression
+
+    def supports(self, obj):
+        # Columnar formats need string column names
+        return isinstance(obj, pd.DataFrame) and all(
+            isinstance(x, str) for x in obj.columns
+        )
+
+    def write(self, obj, filename):
+        obj.to_parquet(filename, compression=self.compression)
+
+    def read(self, filename, columns=None):
+        if columns is not None:
+            import pyarrow.parquet
+
+            names = pyarrow.parquet.read_schema(filename).names
+            columns = [x for x in columns if x in names]
+        return pd.read_parquet(filename, columns=columns)
+
+
+class FeatherBackend(ParquetBackend):
+    name = "feather"
+    extension = ".feather"
+    requires = "pyarrow"
+
+    def __init__(self, compression="lz4"):
+        self.compression = compression
+
+    def supports(self, obj):
+        # Feather does not store an index
+        return super(FeatherBackend, self).supports(obj) and isinstance(
+            obj.index, pd.RangeIndex
+        )
+
+    def write(self, obj, filename):
+        # pandas before 1.1 does not pass a compression on to pyarrow
+        import pyarrow.feather
+
+        pyarrow.feather.write_feather(
+            obj.reset_index(drop=True), str(filename), compression=self.compression
+        )
+
+    def read(self, filename, columns=None):
+        if columns is not None:
+            import pyarrow.ipc
+
+            names = pyarrow.ipc.open_file(str(filename)).schema.names
+            columns = [x for x in columns if x in names]
+        return pd.read_feather(filename, columns=columns)
+
+
+class HDF5Backend(ParquetBackend):
+    name = "hdf5"
+    extension = ".h5"
+    requires = "tables"
+
+    def __init__(self, compression="blosc", compression_level=5):
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def write(self, obj, filename):
+        obj.to_hdf(
+            filename,
+            key="data",
+            mode="w",
+            format="table",
+            complib=self.compression,
+            complevel=self.compression_level,
+        )
+
+    def read(self, filename, columns=None):
+        if columns is not None:
+            with pd.HDFStore(filename, mode="r") as store:
+                names = store.select("data", stop=0).columns
+            columns = [x for x in columns if x in names]
+        return pd.read_hdf(filename, key="data", columns=columns)
+
+
+BACKENDS = {
+    PickleBackend.name: PickleBackend,
+    ParquetBackend.name: ParquetBackend,
+    FeatherBackend.name: FeatherBackend,
+    HDF5Backend.name: HDF5Backend,
+}
+
+
+def get_backend(backend="pickle"):
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(
+            "Unknown storage backend {}, choose from {}".format(
+                backend, ", ".join(BACKENDS)
+            )
+        )
+    backend_class = BACKENDS[backend]
+    requires = backend_class.requires
+    if requires is not None and importlib.util.find_spec(requires) is None:
+        raise ImportError("Storage backend {} requires {}".format(backend, requires))
+    return backend_class()
+
+
+def save_outputs(outputs, folder_name, backend="pickle"):
+    # DataFrames go to columnar files, everything else is pickled together.
+    # File names in the manifest are relative to the node folder.
+    folder_name = pathlib.Path(folder_name)
+    backend = get_backend(backend)
+    if isinstance(outputs, LazyOutputs):
+        # Unchanged outputs loaded from disk are copied without deserializing
+        if not outputs.modified:
+            return outputs.copy_to(folder_name)
+        outputs = dict(outputs)
+    manifest = {"pickle": "outputs.pkl", "frames": {}}
+    if isinstance(outputs, dict):
+        manifest["keys"] = list(outputs)
+    remaining_outputs = outputs
+    if isinstance(outputs, dict) and backend.name != PickleBackend.name:
+        remaining_outputs = {}
+        for key, value in outputs.items():
+            if backend.supports(value):
+                filename = "output_{}{}".format(key, backend.extension)
+                backend.write(value, folder_name / filename)
+                manifest["frames"][key] = {
+                    "filename": filename,
+                    "backend": backend.name,
+                }
+            else:
+                remaining_outputs[key] = value
+    PickleBackend().write(remaining_outputs, folder_name / manifest["pickle"])
+    return manifest
+
+
+def list_output_files(manifest):
+    if isinstance(manifest, str):
+        return [manifest]
+    return [manifest["pickle"]] + [x["filename"] for x in manifest["frames"].values()]
+
+
+def load_outputs(manifest, folder_name, columns=None):
+    folder_name = pathlib.Path(folder_name)
+    # Node states written before manifests existed hold a single pickle path
+    if isinstance(manifest, str):
+        return PickleBackend().read(manifest)
+    outputs = PickleBackend().read(folder_name / manifest["pickle"])
+    for key, entry in manifest["frames"].items():
+        outputs[key] = get_backend(entry["backend"]).read(
+            folder_name / entry["filename"], columns=columns
+        )
+    return outputs
+
+
+class LazyOutputs(collections.abc.MutableMapping):
+    # Node outputs that are read from disk when a key is first accessed
+    def __init__(self, manifest, folder_name, columns=None):
+        self.manifest = manifest
+        self.folder_name = pathlib.Path(folder_name)
+        self.columns = columns
+        self.modified = False
+        self.__outputs = {}
+        self.__pickled_outputs = None
+
+    def __pickled(self):
+        if self.__pickled_outputs is None:
+            # Node states written before manifests existed hold a pickle path
+            if isinstance(self.manifest, str):
+                filename = self.manifest
+            else:
+                filename = self.folder_name / self.manifest["pickle"]
+            self.__pickled_outputs = PickleBackend().read(filename)
+        return self.__pickled_outputs
+
+    def __frames(self):
+        if isinstance(self.manifest, str):
+            return {}
+        return self.manifest["frames"]
+
+    def __stored_keys(self):
+        if not isinstance(self.manifest, str) and "keys" in self.manifest:
+            return list(self.manifest["keys"])
+        return list(self.__frames()) + list(self.__pickled())
+
+    def __getitem__(self, key):
+        if key not in self.__outputs:
+            frames = self.__frames()
+            if key in frames:
+                self.__outputs[key] = get_backend(frames[key]["backend"]).read(
+                    self.folder_name / frames[key]["filename"], columns=self.columns
+                )
+            else:
+                self.__outputs[key] = self.__pickled()[key]
+        return self.__outputs[key]
+
+    def __setitem__(self, key, value):
+        self.__materialize()
+        self.__outputs[key] = value
+
+    def __delitem__(self, key):
+        self.__materialize()
+        del self.__outputs[key]
+
+    def __materialize(self):
+        # Any change turns this into a plain in-memory mapping
+        if not self.modified:
+            self.__outputs = {key: self[key] for key in self.__stored_keys()}
+            self.modified = True
+
+    def __iter__(self):
+        if self.modified:
+            return iter(list(self.__outputs))
+        return iter(self.__stored_keys())
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def is_loaded(self):
+        return bool(self.__outputs) or self.__pickled_outputs is not None
+
+    def release(self):
+        # Drops everything read so far, unchanged outputs can be read again
+        if not self.modified:
+            self.__outputs = {}
+            self.__pickled_outputs = None
+
+    def copy_to(self, folder_name):
+        folder_name = pathlib.Path(folder_name)
+        if isinstance(self.manifest, str):
+            manifest = {"pickle": "outputs.pkl", "frames": {}}
+            copies = [(pathlib.Path(self.manifest), folder_name / "outputs.pkl")]
+        else:
+            manifest = self.manifest
+            copies = [
+                (self.folder_name / x, folder_name / x)
+                for x in list_output_files(manifest)
+            ]
+        for source, destination in copies:
+            if not (destination.exists() and source.samefile(destination)):
+                shutil.copyfile(str(source), str(destination))
+        return manifest
+
+    def __getstate__(self):
+        # Loaded outputs are not pickled, they can be read again from disk
+        state = self.__dict__.copy()
+        if not self.modified:
+            state["_LazyOutputs__outputs"] = {}
+            state["_LazyOutputs__pickled_outputs"] = None
+        return state
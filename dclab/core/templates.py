@@ -0,0 +1,138 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import threading
+import dclab.utilities.preprocessor as preprocessor
+from . import utilities
+
+
+class TemplateCache(object):
+    # Templates are parsed once per content, rendered files are reused for
+    # rows that give the template variables the same values
+    def __init__(self, max_renders=4096):
+        self.max_renders = max_renders
+        self.__dependencies = {}
+        self.__renders = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def template_key(filename):
+        # The digest is only recomputed if the modification time or size change
+        filename = os.path.abspath(str(filename))
+        return filename, utilities.hash_file(filename)
+
+    def dependencies(self, filename):
+        key = self.template_key(filename)
+        with self.__lock:
+            dependencies = self.__dependencies.get(key)
+        if dependencies is None:
+            dependencies = tuple(preprocessor.get_dependencies_from_file(filename))
+            with self.__lock:
+                self.__dependencies[key] = dependencies
+        # Callers may extend the list
+        return list(dependencies)
+
+    def render_key(self, filename, parameter_dict, suffix):
+        values = {
+            x: parameter_dict[x]
+            for x in self.dependencies(filename)
+            if x in parameter_dict
+        }
+        key_dict = {
+            "template": self.template_key(filename),
+            "suffix": suffix,
+            "values": values,
+        }
+        key_string = json.dumps(key_dict, sort_keys=True, default=str)
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def render(self, filename, parameter_dict, output_directory, suffix):
+        key = self.render_key(filename, parameter_dict, suffix)
+        with self.__lock:
+            previous = self.__renders.get(key)
+            if previous is not None:
+                self.__renders.move_to_end(key)
+        if previous is not None and os.path.isfile(previous[0]):
+            return self.__copy_render(previous, output_directory)
+        rendered = preprocessor.preprocess_file(
+            filename=filename,
+            parameter_dict=parameter_dict,
+            output_directory=output_directory,
+            suffix=suffix,
+        )
+        # The preprocessor may return a name relative to the output directory
+        relative = not os.path.dirname(str(rendered))
+        rendered_path = str(rendered)
+        if relative:
+            rendered_path = os.path.join(str(output_directory), rendered_path)
+        with self.__lock:
+            self.__renders[key] = (rendered_path, relative)
+            while len(self.__renders) > self.max_renders:
+                self.__renders.popitem(last=False)
+        return rendered
+
+    def render_batch(self, filename, parameter_dicts, output_directories, suffix):
+        # Command files of many rows in one pass, each distinct set of template
+        # values is rendered once and copied to the other rows. Rows without a
+        # value for every template variable are left to render, None is returned.
+        dependencies = self.dependencies(filename)
+        rendered = list()
+        for parameter_dict, output_directory in zip(
+            parameter_dicts, output_directories
+        ):
+            if not all(x in parameter_dict for x in dependencies):
+                rendered.append(None)
+                continue
+            os.makedirs(str(output_directory), exist_ok=True)
+            rendered.append(
+                self.render(filename, parameter_dict, output_directory, suffix)
+            )
+        return rendered
+
+    @staticmethod
+    def __copy_render(previous, output_directory):
+        rendered_path, relative = previous
+        basename = os.path.basename(rendered_path)
+        output_filename = os.path.join(str(output_directory), basename)
+        if not (
+            os.path.exists(output_filename)
+            and os.path.samefile(rendered_path, output_filename)
+        ):
+            shutil.copyfile(rendered_path, output_filename)
+        return basename if relative else output_filename
+
+    def clear(self):
+        with self.__lock:
+            self.__dependencies = {}
+            self.__renders = collections.OrderedDict()
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes
+        state = self.__dict__.copy()
+        del state["_TemplateCache__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+_cache = TemplateCache()
+
+
+def get_cache():
+    return _cache
+
+
+def dependencies(filename):
+    return _cache.dependencies(filename)
+
+
+def render(filename, parameter_dict, output_directory, suffix):
+    return _cache.render(filename, parameter_dict, output_directory, suffix)
+
+
+def render_batch(filename, parameter_dicts, output_directories, suffix):
+    return _cache.render_batch(filename, parameter_dicts, output_directories, suffix)
@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import os
+import pathlib
+import subprocess
+import threading
+
+
+class ToolRunner(object):
+    # Runs tool invocations in the calling thread, coroutines wait in a thread
+    # pool. Python 3.7 cannot watch child processes from an event loop outside
+    # the main thread, so tools are started with subprocess.
+    def __init__(self, limits=None, timeouts=None, executables=None):
+        # Maximum number of concurrent instances per tool (e.g. license seats)
+        self.limits = dict(limits or {})
+        # Wall-clock timeout in seconds per tool
+        self.timeouts = dict(timeouts or {})
+        # Executable per tool, e.g. to replace sdevice by a local stand-in
+        self.executables = dict(executables or {})
+        self.__pid = None
+        self.__semaphores = {}
+        self.__lock = threading.Lock()
+
+    def __semaphore(self, tool):
+        if tool not in self.limits:
+            return None
+        with self.__lock:
+            # Worker processes forked from a running simulation count their own
+            if self.__pid != os.getpid():
+                self.__pid = os.getpid()
+                self.__semaphores = {}
+            if tool not in self.__semaphores:
+                self.__semaphores[tool] = threading.BoundedSemaphore(self.limits[tool])
+            return self.__semaphores[tool]
+
+    async def run_async(self, tool, arguments, cwd, timeout=None, log_prefix=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(
+                self.run, tool, arguments, cwd, timeout=timeout, log_prefix=log_prefix
+            ),
+        )
+
+    @staticmethod
+    def __execute(command, cwd, timeout, log_prefix):
+        # Output is streamed to log files next to the tool results
+        cwd = pathlib.Path(cwd)
+        with open(cwd / (log_prefix + ".out"), "wb") as stdout, open(
+            cwd / (log_prefix + ".err"), "wb"
+        ) as stderr:
+            process = subprocess.Popen(
+                command, cwd=str(cwd), stdout=stdout, stderr=stderr
+            )
+            try:
+                returncode = process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                raise
+        return subprocess.CompletedProcess(command, returncode)
+
+    def run(self, tool, arguments, cwd, timeout=None, log_prefix=None):
+        # Blocking call, safe to use from several threads at once
+        command = [self.executables.get(tool, tool)] + [str(x) for x in arguments]
+        if timeout is None:
+            timeout = self.timeouts.get(tool)
+        if log_prefix is None:
+            log_prefix = tool
+        semaphore = self.__semaphore(tool)
+        if semaphore is None:
+            return self.__execute(command, cwd, timeout, log_prefix)
+        with semaphore:
+            return self.__execute(command, cwd, timeout, log_prefix)
+
+    def __getstate__(self):
+        # Semaphores and locks stay in the process that created them
+        return {
+            "limits": self.limits,
+            "timeouts": self.timeouts,
+            "executables": self.executables,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+_runner = ToolRunner()
+
+
+def get_runner():
+    return _runner
+
+
+def set_runner(runner):
+    global _runner
+    _runner = runner
+
+
+def configure(limits=None, timeouts=None, executables=None):
+    set_runner(ToolRunner(limits=limits, timeouts=timeouts, executables=executables))
+
+
+def run_tool(tool, arguments, cwd, timeout=None, log_prefix=None):
+    return get_runner().run(
+        tool, arguments, cwd=cwd, timeout=timeout, log_prefix=log_prefix
+    )
@@ -0,0 +1,202 @@
+import collections
+import contextlib
+import json
+import os
+import pathlib
+import resource
+import threading
+import time
+import tabulate
+
+
+def io_counters():
+    # Bytes read and written by the calling thread, zero where unavailable
+    try:
+        with open("/proc/thread-self/io", "rb") as f:
+            counters = dict(line.split(b":") for line in f.read().splitlines())
+        return int(counters[b"rchar"]), int(counters[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def children_usage():
+    # CPU time and block I/O in bytes of finished tool processes, counted for the
+    # whole process. Blocks are 512 bytes and only count storage, not page cache.
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        usage.ru_utime + usage.ru_stime,
+        usage.ru_inblock * 512,
+        usage.ru_oublock * 512,
+    )
+
+
+def peak_rss():
+    # Peak resident set size in bytes since the process started, Linux reports
+    # kilobytes. It is not reset between spans, so it is not a per node value.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Tracer(object):
+    # Writes Chrome trace events as JSON lines, one complete event per span
+    def __init__(self, filename=None):
+        self.filename = filename
+        if self.filename is not None:
+            self.filename = pathlib.Path(self.filename)
+        self.__lock = threading.Lock()
+
+    def enabled(self):
+        return self.filename is not None
+
+    def reset(self):
+        if self.enabled():
+            with open(self.filename, "w"):
+                pass
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        # Callers can add entries to the yielded arguments inside the block
+        if not self.enabled():
+            yield args
+            return
+        start = time.time()
+        start_cpu = time.thread_time()
+        start_children = children_usage()
+        start_read, start_written = io_counters()
+        try:
+            yield args
+        finally:
+            end_read, end_written = io_counters()
+            end_children = children_usage()
+            args.update(
+                {
+                    "cpu_time": time.thread_time() - start_cpu,
+                    "child_cpu_time": end_children[0] - start_children[0],
+                    "process_peak_rss": peak_rss(),
+                    "read_bytes": end_read - start_read,
+                    "written_bytes": end_written - start_written,
+                    "child_read_bytes": end_children[1] - start_children[1],
+                    "child_written_bytes": end_children[2] - start_children[2],
+                }
+            )
+            self.record(name, category, start, time.time() - start, args)
+
+    def record(self, name, category, start, duration, args=None):
+        if not self.enabled():
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": int(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args or {},
+        }
+        line = json.dumps(event, cls=TraceEncoder) + "\n"
+        # Single appends keep rows in worker processes from interleaving lines
+        with self.__lock:
+            fd = os.open(
+                str(self.filename), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes
+        state = self.__dict__.copy()
+        del state["_Tracer__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+class TraceEncoder(json.JSONEncoder):
+    # Row IDs and counters may be numpy scalars
+    def default(self, obj):
+        if hasattr(obj, "item"):
+            return obj.item()
+        return str(obj)
+
+
+def load_trace(filename):
+    with open(filename, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def export_chrome_trace(filename, output_filename):
+    # The JSON object format can be opened in chrome://tracing or Perfetto
+    with open(output_filename, "w") as f:
+        f.write(
+            json.dumps({"traceEvents": load_trace(filename), "displayTimeUnit": "ms"})
+        )
+
+
+def summarize(events):
+    # Totals per category and span name, in order of the first start
+    summary = collections.OrderedDict()
+    for event in sorted(events, key=lambda x: x["ts"]):
+        key = (event["cat"], event["name"])
+        if key not in summary:
+            summary[key] = collections.Counter()
+        entry = summary[key]
+        args = event["args"]
+        entry["count"] += 1
+        entry["wall_time"] += event["dur"] / 1e6
+        entry["cpu_time"] += args.get("cpu_time", 0) + args.get("child_cpu_time", 0)
+        entry["process_peak_rss"] = max(
+            entry["process_peak_rss"], args.get("process_peak_rss", 0)
+        )
+        entry["read_bytes"] += args.get("read_bytes", 0) + args.get(
+            "child_read_bytes", 0
+        )
+        entry["written_bytes"] += args.get("written_bytes", 0) + args.get(
+            "child_written_bytes", 0
+        )
+        if "cache" in args:
+            entry[args["cache"]] += 1
+    return summary
+
+
+def summary_to_string(events):
+    list_to_print = list()
+    for (category, name), entry in summarize(events).items():
+        hits = entry["index"] + entry["cache"]
+        misses = entry["miss"]
+        # Only nodes can be found in the index or the cache
+        if hits + misses == 0:
+            hits, misses = "", ""
+        list_to_print.append(
+            [
+                category,
+                name,
+                entry["count"],
+                hits,
+                misses,
+                "{:.3f}".format(entry["wall_time"]),
+                "{:.3f}".format(entry["cpu_time"]),
+                "{:.1f}".format(entry["process_peak_rss"] / 2 ** 20),
+                "{:.2f}".format(entry["read_bytes"] / 2 ** 20),
+                "{:.2f}".format(entry["written_bytes"] / 2 ** 20),
+            ]
+        )
+    summary_string = tabulate.tabulate(
+        list_to_print,
+        headers=[
+            "Category",
+            "Name",
+            "Count",
+            "Hits",
+            "Misses",
+            "Wall [s]",
+            "CPU [s]",
+            "Process peak RSS [MB]",
+            "Read [MB]",
+            "Written [MB]",
+        ],
+    )
+    return summary_string
@@ -1,6 +1,11 @@
+import hashlib
 import json
+import os
 import numpy
 
+# Digests are reused as long as a file keeps its size and modification time
+_file_digests = {}
+
 
 class JsonEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -8,7 +13,24 @@ class JsonEncoder(json.JSONEncoder):
             return int(obj)
         elif isinstance(obj, numpy.floating):
             return float(obj)
+        elif isinstance(obj, numpy.bool_):
+            return bool(obj)
         elif isinstance(obj, numpy.ndarray):
             return obj.tolist()
         else:
-            return super(MyEncoder, self).default(obj)
+            return super(JsonEncoder, self).default(obj)
+
+
+def hash_file(filename, block_size=1 << 20):
+    filename = os.path.abspath(str(filename))
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_digests.get(filename)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    _file_digests[filename] = (key, digest.hexdigest())
+    return digest.hexdigest()
@@ -1,135 +1,696 @@
+import collections.abc
+import concurrent.futures
 import fnmatch
+import mmap
+import multiprocessing
+import pathlib
 import re
 import os
-import subprocess
-from io import StringIO
+import threading
 import numpy as np
 import pandas as pd
 import dclab.core as core
+import dclab.core.cache as cache
 import dclab.core.decorators as decorators
+import dclab.core.tools as tools
+
+
+class RegionMasks(object):
+    # Sorted vertex indices per region instead of one dense column per region
+    def __init__(self, vertex_dict, n_vertices):
+        self.n_vertices = n_vertices
+        self.regions = list(vertex_dict)
+        self.vertices = {
+            key: np.unique(np.asarray(value, dtype=np.int64))
+            for key, value in vertex_dict.items()
+        }
+
+    def region_codes(self):
+        # Vertices shared by several regions belong to the first one listed,
+        # vertices outside all regions get -1
+        codes = np.full(self.n_vertices, -1, dtype=np.int16)
+        for code in reversed(range(len(self.regions))):
+            codes[self.vertices[self.regions[code]]] = code
+        return codes
+
+    def to_categorical(self):
+        return pd.Categorical.from_codes(self.region_codes(), categories=self.regions)
+
+    def mask(self, region):
+        mask = np.zeros(self.n_vertices, dtype=bool)
+        mask[self.vertices[region]] = True
+        return mask
+
+    def ranges(self, region):
+        # Runs of consecutive vertices as (start, stop) pairs
+        vertices = self.vertices[region]
+        if len(vertices) == 0:
+            return list()
+        breaks = np.flatnonzero(np.diff(vertices) != 1) + 1
+        starts = vertices[np.concatenate([[0], breaks])]
+        stops = vertices[np.concatenate([breaks - 1, [len(vertices) - 1]])] + 1
+        return list(zip(starts.tolist(), stops.tolist()))
+
+    def to_dense(self):
+        return pd.DataFrame(
+            {key: self.mask(key).astype(float) for key in self.regions},
+            columns=self.regions,
+        )
 
 
-def extract_region_masks(vertex_dict, target_frame):
-    for key, value in vertex_dict.items():
-        target_frame[key] = pd.Series(data=np.ones(np.array(value).shape), index=value)
-        target_frame[key].fillna(value=0, inplace=True)
+def extract_region_masks(vertex_dict, target_frame, dense=False):
+    # Region membership is stored as a single categorical 'region' column, the
+    # full vertex lists are kept in the frame attributes for select_region.
+    # Dense 1.0/0.0 columns per region are still available on request.
+    region_masks = RegionMasks(vertex_dict, n_vertices=len(target_frame.index))
+    if dense:
+        for key in region_masks.regions:
+            target_frame[key] = region_masks.mask(key).astype(float)
+        return target_frame
+    target_frame["region"] = pd.Series(
+        region_masks.to_categorical(), index=target_frame.index
+    )
+    target_frame.attrs["region_masks"] = region_masks
     return target_frame
 
 
-def match_vertex_with_data_to_series(vertex_dict, data_dict):
-    output_vertices = list()
-    output_data = list()
-    for key, data in data_dict.items():
-        assert key in vertex_dict
-        vertices = vertex_dict[key]
-        assert len(data) == len(vertices)
-        output_vertices += vertices
-        output_data += data
-    output_series = pd.Series(data=output_data, index=output_vertices).sort_index()
-    output_series = output_series[~output_series.index.duplicated(keep="first")]
-    return output_series
+def select_region(frame, region):
+    # Rows of a DF-ISE frame that belong to a region, the vertex indices are
+    # labels so that filtered or reordered frames still select the right rows
+    region_masks = frame.attrs.get("region_masks")
+    if region_masks is not None:
+        return frame.loc[frame.index.intersection(region_masks.vertices[region])]
+    if region in frame.columns:
+        return frame[frame[region] == 1]
+    return frame[frame["region"] == region]
+
+
+# DF-ISE blocks are indexed with a single pass over the (memory-mapped) file
+_DATASET_PATTERN = re.compile(
+    rb'Dataset\s*\(\s*"(?P<name>[^"]*)"\s*\)\s*\{(?P<header>[^{}]*?)'
+    rb"Values\s*\(\s*(?P<count>\d+)\s*\)\s*\{"
+)
+_VALIDITY_PATTERN = re.compile(rb'validity\s*=\s*\[\s*"([^"]*)"')
+_TYPE_PATTERN = re.compile(rb"type\s*=\s*(\w+)")
+_DATASETS_PATTERN = re.compile(rb"datasets\s*=\s*\[([^\]]*)\]")
+_VERTICES_PATTERN = re.compile(rb"Vertices\s*\(\s*(\d+)\s*\)\s*\{([^}]*)\}")
+_DIMENSION_PATTERN = re.compile(rb"dimension\s*=\s*(\d+)")
+_COORDINATE_NAMES = ["X", "Y", "Z"]
+
+# Fixed width scientific values are decoded as integers on the bytes around "e".
+# Mantissas below 2**53 times an exact power of ten are rounded only once, like
+# in np.fromstring. The tables are indexed by exponent + 22, negative values in
+# the second half.
+_POWERS_OF_TEN = 10.0 ** np.arange(23)
+_MULTIPLIERS = np.concatenate([np.ones(22), _POWERS_OF_TEN])
+_MULTIPLIERS = np.concatenate([_MULTIPLIERS, -_MULTIPLIERS])
+_DIVISORS = np.tile(np.concatenate([_POWERS_OF_TEN[:0:-1], np.ones(23)]), 2)
+_MAX_EXACT_MANTISSA = np.uint64(2 ** 53)
+_ZERO_DIGITS = np.uint64(0x3030303030303030)
+_HIGH_NIBBLES = np.uint64(0xF0F0F0F0F0F0F0F0)
+_SIXES = np.uint64(0x0606060606060606)
+# Room for the bytes read around the first and the last value
+_PADDING = b" " * 24
+
+
+class VertexMatcher(object):
+    # Places the values of all regions at their vertices. The order only
+    # depends on the regions a parameter is defined on and is reused.
+    def __init__(self, vertex_dict, n_vertices):
+        self.vertex_dict = vertex_dict
+        self.n_vertices = n_vertices
+        self.__orders = {}
+
+    def __order(self, regions):
+        if regions not in self.__orders:
+            vertices = np.concatenate([self.vertex_dict[x] for x in regions])
+            # Stable sort so that the first region listed wins for shared vertices
+            order = np.argsort(vertices, kind="stable")
+            unique_vertices, first_index = np.unique(vertices[order], return_index=True)
+            inside = (unique_vertices >= 0) & (unique_vertices < self.n_vertices)
+            self.__orders[regions] = (
+                unique_vertices[inside],
+                order[first_index[inside]],
+            )
+        return self.__orders[regions]
+
+    def match(self, data_dict):
+        output = np.full(self.n_vertices, np.nan)
+        if not data_dict:
+            return output
+        for key, data in data_dict.items():
+            assert key in self.vertex_dict
+            assert len(data) == len(self.vertex_dict[key])
+        vertices, take = self.__order(tuple(data_dict))
+        output[vertices] = np.concatenate(list(data_dict.values()))[take]
+        return output
+
+
+def _to_buffer(content):
+    if isinstance(content, str):
+        return content.encode()
+    return content
+
+
+def index_dfise_datasets(dat):
+    dat = _to_buffer(dat)
+    datasets = list()
+    match = _DATASET_PATTERN.search(dat)
+    while match is not None:
+        header = match.group("header")
+        # The end of the values is found with a plain search, not the regex
+        values_end = dat.find(b"}", match.end())
+        datasets.append(
+            {
+                "name": match.group("name").decode(),
+                "region": _VALIDITY_PATTERN.search(header).group(1).decode(),
+                "type": _TYPE_PATTERN.search(header).group(1).decode(),
+                "count": int(match.group("count")),
+                "values": (match.end(), values_end),
+            }
+        )
+        match = _DATASET_PATTERN.search(dat, values_end)
+    return datasets
+
 
+def list_dfise_parameters(dat):
+    parameter_list_str = _DATASETS_PATTERN.search(_to_buffer(dat)).group(1)
+    parameter_list = re.findall(rb'"([^"]*)"', parameter_list_str)
+    return list(dict.fromkeys(x.decode() for x in parameter_list))
 
-def extract_data_for_parameter(dat, parameter_name, is_integer=False):
-    elements = dat.split("Data ")[1].split('"' + parameter_name + '"')[1:]
+
+def _parse_eight_digits(words):
+    # Eight ASCII digits per little-endian word, the first digit in the lowest byte
+    words = words - _ZERO_DIGITS
+    words = words * np.uint64(10) + (words >> np.uint64(8))
+    words &= np.uint64(0x00FF00FF00FF00FF)
+    words = words * np.uint64(100) + (words >> np.uint64(16))
+    words &= np.uint64(0x0000FFFF0000FFFF)
+    words = words * np.uint64(10000) + (words >> np.uint64(32))
+    return words & np.uint64(0xFFFFFFFF)
+
+
+def _are_digits(words):
+    return ((words & _HIGH_NIBBLES) == _ZERO_DIGITS) & (
+        ((words + _SIXES) & _HIGH_NIBBLES) == _ZERO_DIGITS
+    )
+
+
+def _keep_last_digits(words, n_digits):
+    # The other bytes become "0" and do not change the number
+    if n_digits >= 8:
+        return words
+    keep = ~np.uint64(0) << np.uint64(8 * (8 - n_digits))
+    return (words & keep) | (_ZERO_DIGITS & ~keep)
+
+
+def _decode_scientific_chunk(data, e, n_decimals):
+    # 32 bytes around each "e", which is at byte 24
+    rows = np.lib.stride_tricks.as_strided(
+        data, shape=(len(data) - 31, 32), strides=(1, 1)
+    )[e - 24]
+    words = rows.view(np.uint64)
+    decimals = _keep_last_digits(words[:, 2], n_decimals)
+    valid = _are_digits(decimals)
+    mantissa = _parse_eight_digits(decimals)
+    if n_decimals > 8:
+        decimals = _keep_last_digits(words[:, 1], n_decimals - 8)
+        valid &= _are_digits(decimals)
+        mantissa += _parse_eight_digits(decimals) * np.uint64(10 ** 8)
+    integer = rows[:, 22 - n_decimals] - np.uint8(48)
+    before = rows[:, 21 - n_decimals]
+    exponent_sign = rows[:, 25]
+    first_digit = rows[:, 26] - np.uint8(48)
+    second_digit = rows[:, 27] - np.uint8(48)
+    negative = before == ord("-")
+    valid &= (rows[:, 23 - n_decimals] == ord(".")) & (integer <= 9)
+    valid &= (before <= 32) | (negative & (rows[:, 20 - n_decimals] <= 32))
+    valid &= (first_digit <= 9) & (second_digit <= 9) & (rows[:, 28] <= 32)
+    valid &= (exponent_sign == ord("+")) | (exponent_sign == ord("-"))
+    if not valid.all():
+        return None, 0
+    mantissa += integer.astype(np.uint64) * np.uint64(10 ** n_decimals)
+    exponent = first_digit.astype(np.int16) * 10 + second_digit
+    # 1 for "+" and -1 for "-"
+    exponent *= 44 - exponent_sign.astype(np.int16)
+    exponent -= np.int16(n_decimals)
+    slow = np.flatnonzero((np.abs(exponent) > 22) | (mantissa >= _MAX_EXACT_MANTISSA))
+    np.clip(exponent, -22, 22, out=exponent)
+    exponent += 22 + 45 * negative
+    values = mantissa.astype(float)
+    values *= _MULTIPLIERS[exponent]
+    values /= _DIVISORS[exponent]
+    if len(slow):
+        # The rest is left to numpy, one fixed width token at a time
+        tokens = rows[slow, 21 - n_decimals : 30].copy()
+        tokens[:, -1] = ord(" ")
+        values[slow] = np.fromstring(tokens.tobytes(), sep=" ")
+    return values, np.count_nonzero(negative)
+
+
+def decode_scientific(buffer, count, chunk_size=1 << 19):
+    # Values like -1.2345e+01 with the same number of decimals, None for anything
+    # else. Chunks keep the intermediate arrays in the cache.
+    if count == 0 or not np.little_endian:
+        return None
+    first = buffer.find(b"e")
+    n_decimals = first - buffer.rfind(b".", 0, first) - 1
+    if not 0 < n_decimals < 16:
+        return None
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    values = np.empty(count)
+    n_values = 0
+    n_characters = 0
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start : start + chunk_size]
+        n_characters += np.count_nonzero(chunk > 32)
+        e = np.flatnonzero(chunk == ord("e")) + start
+        if len(e) == 0:
+            continue
+        if e[0] < 24 or e[-1] + 8 > len(data) or n_values + len(e) > count:
+            return None
+        chunk_values, n_negative = _decode_scientific_chunk(data, e, n_decimals)
+        if chunk_values is None:
+            return None
+        values[n_values : n_values + len(e)] = chunk_values
+        n_values += len(e)
+        n_characters -= n_negative
+    # Nothing but the values may be in the buffer
+    if n_values != count or n_characters != count * (n_decimals + 6):
+        return None
+    return values
+
+
+def decode_values(dat, span, is_integer=False):
+    values = np.fromstring(_to_buffer(dat)[span[0] : span[1]], sep=" ")
+    if is_integer:
+        values = values.astype(int)
+    return values
+
+
+def decode_datasets(dat, datasets):
+    # The values of all datasets are decoded in bulk
+    dat = _to_buffer(dat)
+    if not datasets:
+        return list()
+    counts = [x["count"] for x in datasets]
+    spans = [x["values"] for x in datasets]
+    # Views on the buffer, so the values are only copied once
+    view = memoryview(dat)
+    block = b" ".join([_PADDING] + [view[x[0] : x[1]] for x in spans] + [_PADDING])
+    values = decode_scientific(block, sum(counts))
+    if values is None:
+        values = np.fromstring(block, sep=" ")
+    if len(values) != sum(counts):
+        # Headers that do not match their values are decoded one by one
+        return [decode_values(dat, x) for x in spans]
+    return np.split(values, np.cumsum(counts)[:-1])
+
+
+def decode_vertices(grd):
+    grd = _to_buffer(grd)
+    vertices_match = _VERTICES_PATTERN.search(grd, grd.find(b"Data {"))
+    n_vertices = int(vertices_match.group(1))
+    dimension = int(_DIMENSION_PATTERN.search(grd).group(1))
+    vertices = {"count": n_vertices * dimension, "values": vertices_match.span(2)}
+    coordinates = decode_datasets(grd, [vertices])[0]
+    return coordinates.reshape((n_vertices, -1))
+
+
+def extract_data_for_parameter(dat, parameter_name, is_integer=False, datasets=None):
+    if datasets is None:
+        datasets = index_dfise_datasets(dat)
+    datasets = [
+        x for x in datasets if x["name"] == parameter_name and x["type"] == "scalar"
+    ]
     output_dict = {}
-    for element in elements:
-        region_name = element.split("validity")[1].split('"')[1]
-        type = element.split("type")[1].split("\n")[0].replace("=", "").replace(" ", "")
-        if type == "scalar":
-            data_str = (
-                element.split("Values")[1]
-                .split("{")[1]
-                .split("}")[0]
-                .replace("\n", "")
-                .strip()
-                .split(" ")
-            )
-            converter = lambda x: float(x)
-            if is_integer:
-                converter = lambda x: int(float(x))
-            data = list(map(converter, data_str))
-            output_dict[region_name] = data
+    for dataset, values in zip(datasets, decode_datasets(dat, datasets)):
+        if is_integer:
+            values = values.astype(int)
+        output_dict[dataset["region"]] = values
     return output_dict
 
 
-def load_dfise_file(grd_filename, dat_filename):
-    grd = ""
-    dat = ""
+def worker_count(max_workers, n_jobs):
+    # A pool is only worth starting for more than one job and worker
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    return max(1, min(max_workers, n_jobs))
+
+
+# Parsing pools are started once per process and size, then reused by all nodes
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+
+def get_process_pool(max_workers):
+    key = (os.getpid(), max_workers)
+    with _process_pools_lock:
+        if key not in _process_pools:
+            _process_pools[key] = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers
+            )
+        return _process_pools[key]
 
-    with open(grd_filename, "r") as f:
-        grd = f.read()
-    with open(dat_filename, "r") as f:
-        dat = f.read()
 
-    return parse_dfise_str(grd, dat)
+def shutdown_process_pools():
+    with _process_pools_lock:
+        pools = [
+            pool for (pid, _), pool in _process_pools.items() if pid == os.getpid()
+        ]
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown()
 
 
-def parse_dfise_str(grd, dat):
+def load_dfise_file(grd_filename, dat_filename, parameters=None, dense_regions=False):
+    return DFISEData(
+        grd_filename=grd_filename,
+        dat_filename=dat_filename,
+        parameters=parameters,
+        dense_regions=dense_regions,
+    ).to_frame()
+
+
+def parse_dfise_str(grd, dat, parameters=None, dense_regions=False):
+    grd = _to_buffer(grd)
+    dat = _to_buffer(dat)
     # Vertices
-    vertices_str = (
-        "X Y" + grd.split("Data {")[1].split("Vertices")[1].split("{")[1].split("}")[0]
-    )
-    output_frame = pd.read_csv(StringIO(vertices_str), delim_whitespace=True)
+    coordinates = decode_vertices(grd)
+    columns = {
+        key: coordinates[:, i]
+        for i, key in enumerate(_COORDINATE_NAMES[: coordinates.shape[1]])
+    }
 
     # Parameters
-    parameter_list_str = (
-        dat.split("datasets")[1].split("[")[1].split("]")[0].strip().split('" "')
-    )
-    replacer = lambda s: s.replace('"', "")
-    parameter_list = list(set(map(replacer, parameter_list_str)))
+    parameter_list = list_dfise_parameters(dat)
     assert "VertexIndex" in parameter_list
-    indices = extract_data_for_parameter(
-        dat=dat, parameter_name="VertexIndex", is_integer=True
+    if parameters is not None:
+        parameter_list = [x for x in parameter_list if x in parameters]
+    # Only the scalar datasets that are needed are decoded, all in one go
+    names = set(parameter_list) | {"VertexIndex"}
+    datasets = [
+        x
+        for x in index_dfise_datasets(dat)
+        if x["type"] == "scalar" and x["name"] in names
+    ]
+    data_dicts = {key: {} for key in names}
+    # Integer indices and scientific parameter values are decoded separately
+    for is_index in [True, False]:
+        group = [x for x in datasets if (x["name"] == "VertexIndex") == is_index]
+        for dataset, values in zip(group, decode_datasets(dat, group)):
+            data_dicts[dataset["name"]][dataset["region"]] = values
+    indices = {
+        key: value.astype(int) for key, value in data_dicts["VertexIndex"].items()
+    }
+
+    # Match to vertex index
+    matcher = VertexMatcher(indices, n_vertices=coordinates.shape[0])
+    for parameter in parameter_list:
+        columns[parameter] = matcher.match(data_dicts[parameter])
+    output_frame = pd.DataFrame(columns, columns=list(columns))
+    output_frame = extract_region_masks(
+        vertex_dict=indices, target_frame=output_frame, dense=dense_regions
     )
+    return output_frame
 
-    for parameter in parameter_list:
-        # Get data from dfise string
-        dataset = extract_data_for_parameter(dat=dat, parameter_name=parameter)
-        # Match to vertex index
-        data_series = match_vertex_with_data_to_series(
-            vertex_dict=indices, data_dict=dataset
+
+class DFISEData(collections.abc.Mapping):
+    # Dict-like view on a DF-ISE file pair, columns are decoded on first access
+    def __init__(
+        self, grd_filename, dat_filename, parameters=None, dense_regions=False
+    ):
+        self.grd_filename = str(grd_filename)
+        self.dat_filename = str(dat_filename)
+        self.parameters = parameters
+        # Regions are a single 'region' column unless dense columns are asked for
+        self.dense_regions = dense_regions
+        self.__files = None
+
+    def __open(self):
+        if self.__files is not None:
+            return
+        files = {}
+        for key, filename in [("grd", self.grd_filename), ("dat", self.dat_filename)]:
+            with open(filename, "rb") as f:
+                files[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        grd = files["grd"]
+        dat = files["dat"]
+        dimension = int(_DIMENSION_PATTERN.search(grd).group(1))
+        self.__coordinate_list = _COORDINATE_NAMES[:dimension]
+        self.__n_vertices = int(
+            _VERTICES_PATTERN.search(grd, grd.find(b"Data {")).group(1)
         )
-        # Add to output dataframe
-        output_frame[parameter] = data_series
-    output_frame = extract_region_masks(vertex_dict=indices, target_frame=output_frame)
-    return output_frame
+        self.__datasets = index_dfise_datasets(dat)
+        parameter_list = list_dfise_parameters(dat)
+        assert "VertexIndex" in parameter_list
+        if self.parameters is not None:
+            parameter_list = [x for x in parameter_list if x in self.parameters]
+        self.__parameter_list = parameter_list
+        self.__region_list = list(
+            dict.fromkeys(
+                x["region"] for x in self.__datasets if x["name"] == "VertexIndex"
+            )
+        )
+        self.__region_columns = ["region"]
+        if self.dense_regions:
+            self.__region_columns = self.__region_list
+        self.__indices = None
+        self.__matcher = None
+        self.__region_masks = None
+        self.__columns = {}
+        self.__files = files
+
+    def close(self):
+        if self.__files is not None:
+            for buffer in self.__files.values():
+                buffer.close()
+            self.__files = None
+
+    def release(self):
+        # Drops decoded columns, they are decoded again when accessed
+        if self.__files is not None:
+            self.__columns = {}
+            self.__indices = None
+            self.__matcher = None
+            self.__region_masks = None
+
+    def regions(self):
+        self.__open()
+        return list(self.__region_list)
+
+    def region_masks(self):
+        self.__open()
+        if self.__region_masks is None:
+            self.__region_masks = RegionMasks(
+                self.__vertex_indices(), n_vertices=self.__n_vertices
+            )
+        return self.__region_masks
+
+    def select_region(self, region, columns=None):
+        # Only the vertices of the region are taken from each column
+        if columns is None:
+            columns = [x for x in self if x not in self.__region_columns]
+        vertices = self.region_masks().vertices[region]
+        return pd.DataFrame(
+            {key: self[key].values[vertices] for key in columns},
+            index=vertices,
+            columns=columns,
+        )
+
+    def __vertex_indices(self):
+        if self.__indices is None:
+            self.__indices = extract_data_for_parameter(
+                dat=self.__files["dat"],
+                parameter_name="VertexIndex",
+                is_integer=True,
+                datasets=self.__datasets,
+            )
+        return self.__indices
+
+    def __vertex_matcher(self):
+        if self.__matcher is None:
+            self.__matcher = VertexMatcher(
+                self.__vertex_indices(), n_vertices=self.__n_vertices
+            )
+        return self.__matcher
 
-    pass
+    def __coordinates(self):
+        coordinates = decode_vertices(self.__files["grd"])
+        for i, key in enumerate(self.__coordinate_list):
+            self.__columns[key] = pd.Series(data=coordinates[:, i])
+
+    def __decode_column(self, key):
+        if key in self.__parameter_list:
+            dataset = extract_data_for_parameter(
+                dat=self.__files["dat"], parameter_name=key, datasets=self.__datasets
+            )
+            return pd.Series(data=self.__vertex_matcher().match(dataset))
+        if key == "region":
+            return pd.Series(self.region_masks().to_categorical())
+        return pd.Series(data=self.region_masks().mask(key).astype(float))
+
+    def __getitem__(self, key):
+        self.__open()
+        if key not in self.__columns:
+            if key in self.__coordinate_list:
+                self.__coordinates()
+            elif key in self.__parameter_list or key in self.__region_columns:
+                self.__columns[key] = self.__decode_column(key)
+            else:
+                raise KeyError(key)
+        return self.__columns[key]
+
+    def __iter__(self):
+        self.__open()
+        return iter(
+            self.__coordinate_list + self.__parameter_list + self.__region_columns
+        )
+
+    def __len__(self):
+        self.__open()
+        return (
+            len(self.__coordinate_list)
+            + len(self.__parameter_list)
+            + len(self.__region_columns)
+        )
+
+    def to_frame(self, columns=None):
+        if columns is None:
+            columns = list(self)
+        frame = pd.DataFrame({key: self[key] for key in columns}, columns=columns)
+        if "region" in columns:
+            frame.attrs["region_masks"] = self.region_masks()
+        return frame
+
+    def __getstate__(self):
+        # Only the file names are pickled, mapped files are reopened on access
+        return {
+            "grd_filename": self.grd_filename,
+            "dat_filename": self.dat_filename,
+            "parameters": self.parameters,
+            "dense_regions": self.dense_regions,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__files = None
 
 
 class DataExplorer(core.Node):
-    def __init__(self, source_node, filter="*.tdr"):
+    tool = "tdx"
+    arguments = ["-rel", "N-2017.09", "-dd", "-M", "0", "-S", "0"]
+
+    def __init__(
+        self,
+        source_node,
+        filter="*.tdr",
+        timeout=None,
+        max_workers=1,
+        cache_conversions=True,
+    ):
         super(DataExplorer, self).__init__()
         self.input_files = core.FileDependency(
             source_node=source_node, file_filter=filter, select_id=-1
         )
+        self.timeout = timeout
+        # Number of concurrent tdx conversions, tool limits still apply
+        self.max_workers = max_workers
+        # Identical TDR files of different rows are only converted once
+        self.cache_conversions = cache_conversions
+        self.conversion_cache = None
+
+    def initialize(self, state):
+        self.conversion_cache = None
+        if self.cache_conversions:
+            self.conversion_cache = cache.ConversionCache(
+                pathlib.Path(state.base_dir) / "tdx_cache"
+            )
+
+    def convert(self, file):
+        # One log per converted file
+        log_prefix = "tdx_{}".format(os.path.basename(str(file)))
+        if self.conversion_cache is None:
+            return tools.run_tool(
+                "tdx",
+                self.arguments + [file],
+                cwd=self.sim_dir,
+                timeout=self.timeout,
+                log_prefix=log_prefix,
+            )
+        key = self.conversion_cache.cache_key(file, self.arguments)
+        if self.conversion_cache.restore(key, self.sim_dir) is not None:
+            return None
+        with self.conversion_cache.workspace() as workspace:
+            # Converted on its own so that the outputs of the file are known
+            basename = os.path.basename(str(file))
+            cache.link_file(file, workspace / basename)
+            result = tools.run_tool(
+                "tdx",
+                self.arguments + [basename],
+                cwd=workspace,
+                timeout=self.timeout,
+                log_prefix=log_prefix,
+            )
+            log_files = [log_prefix + ".out", log_prefix + ".err"]
+            output_files = list()
+            for filename in sorted(workspace.iterdir()):
+                if filename.name in log_files:
+                    os.replace(str(filename), os.path.join(self.sim_dir, filename.name))
+                elif filename.name != basename:
+                    output_files.append(filename)
+            if result.returncode == 0:
+                self.conversion_cache.store(key, output_files)
+                self.conversion_cache.restore(key, self.sim_dir)
+            else:
+                # Failed conversions are kept for inspection but not cached
+                for filename in output_files:
+                    os.replace(str(filename), os.path.join(self.sim_dir, filename.name))
+        return result
 
     @decorators.record_output
     def run(self):
 
-        for file in self.input_files:
-            command = (
-                "(cd "
-                + str(self.sim_dir)
-                + " && tdx -rel N-2017.09 -dd -M 0 -S 0 "
-                + str(file)
-                + ")"
-            )
-            subprocess.run(command, shell=True)
+        input_files = list(self.input_files)
+        max_workers = worker_count(self.max_workers, len(input_files))
+        # More threads than tdx licenses would only wait in the tool runner
+        limit = tools.get_runner().limits.get(self.tool)
+        if limit is not None:
+            max_workers = max(1, min(max_workers, limit))
+        if max_workers == 1:
+            for file in input_files:
+                self.convert(file)
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Raises the first failed conversion
+            list(executor.map(self.convert, input_files))
 
         return
 
 
 class ImportDFISE(core.Node):
     def __init__(
-        self, source_node, filter="", index=0, csv_output_filename="dfise.csv"
+        self,
+        source_node,
+        filter="",
+        index=0,
+        csv_output_filename="dfise.csv",
+        parameters=None,
+        lazy=False,
+        dense_regions=False,
+        max_workers=1,
     ):
         super(ImportDFISE, self).__init__()
         self.source_file = core.FileDependency(
             source_node=source_node, file_filter=filter, select_id=index
         )
         self.csv_output_filename = csv_output_filename
+        # Restricts the exposed fields, lazy data is decoded on first access
+        self.parameters = parameters
+        self.lazy = lazy
+        self.dense_regions = dense_regions
+        # Number of processes parsing files, lazy data is not parsed upfront
+        self.max_workers = max_workers
 
     def initialize(self, state):
         self.input_files = {}
@@ -139,7 +700,10 @@ class ImportDFISE(core.Node):
         if isinstance(self.source_file, str):
             source_file_list = list([self.source_file])
 
-        source_file_list = list(set([os.path.splitext(f)[0] for f in source_file_list]))
+        # Sorted so that the data is always assembled in the same order
+        source_file_list = sorted(
+            set([os.path.splitext(f)[0] for f in source_file_list])
+        )
         source_key_list = [os.path.split(f)[1] for f in source_file_list]
 
         self.input_files = dict(zip(source_key_list, source_file_list))
@@ -147,12 +711,39 @@ class ImportDFISE(core.Node):
         self.data = {}
 
     def run(self):
-        for key, value in self.input_files.items():
-            grd_file = value + ".grd"
-            dat_file = value + ".dat"
-            self.data[key] = load_dfise_file(
-                grd_filename=grd_file, dat_filename=dat_file
+        keys = list(self.input_files)
+        grd_files = [self.input_files[key] + ".grd" for key in keys]
+        dat_files = [self.input_files[key] + ".dat" for key in keys]
+        n_files = len(keys)
+        max_workers = worker_count(self.max_workers, n_files)
+        if self.lazy:
+            data = map(
+                DFISEData,
+                grd_files,
+                dat_files,
+                [self.parameters] * n_files,
+                [self.dense_regions] * n_files,
             )
+            self.data = dict(zip(keys, data))
+        elif max_workers == 1 or self.__in_daemon_process():
+            data = map(
+                load_dfise_file,
+                grd_files,
+                dat_files,
+                [self.parameters] * n_files,
+                [self.dense_regions] * n_files,
+            )
+            self.data = dict(zip(keys, data))
+        else:
+            # Results come back in input order
+            data = get_process_pool(max_workers).map(
+                load_dfise_file,
+                grd_files,
+                dat_files,
+                [self.parameters] * n_files,
+                [self.dense_regions] * n_files,
+            )
+            self.data = dict(zip(keys, data))
         if len(self.data) == 1:
             self.data = list(self.data.values())[0]
 
@@ -170,21 +761,55 @@ class ImportDFISE(core.Node):
                         + key
                         + ".csv"
                     )
-                    value.to_csv(path_or_buf=self.sim_dir + filename)
+                    self.__to_frame(value).to_csv(path_or_buf=self.sim_dir + filename)
             else:
-                self.data.to_csv(path_or_buf=self.sim_dir + self.csv_output_filename)
+                self.__to_frame(self.data).to_csv(
+                    path_or_buf=self.sim_dir + self.csv_output_filename
+                )
         return {}
 
+    @staticmethod
+    def __in_daemon_process():
+        # Daemon processes, e.g. some pool workers, cannot start a process pool
+        return multiprocessing.current_process().daemon
+
+    @staticmethod
+    def __to_frame(data):
+        if isinstance(data, DFISEData):
+            return data.to_frame()
+        return data
+
 
 class ImportTDR(core.Node):
-    def __init__(self, source_node, filter=".*.tdr", index=0, csv_output_filename=""):
+    def __init__(
+        self,
+        source_node,
+        filter=".*.tdr",
+        index=0,
+        csv_output_filename="",
+        parameters=None,
+        lazy=False,
+        dense_regions=False,
+        max_workers=1,
+        cache_conversions=True,
+    ):
         super(ImportTDR, self).__init__()
-        data_node = DataExplorer(source_node=source_node, filter=filter)
+        data_node = DataExplorer(
+            source_node=source_node,
+            filter=filter,
+            max_workers=max_workers,
+            cache_conversions=cache_conversions,
+        )
         dfise_node = ImportDFISE(
-            source_node=data_node, index=index, csv_output_filename=csv_output_filename
+            source_node=data_node,
+            index=index,
+            csv_output_filename=csv_output_filename,
+            parameters=parameters,
+            lazy=lazy,
+            dense_regions=dense_regions,
+            max_workers=max_workers,
         )
         self.data = core.Dependency(source_node=dfise_node, attribute="data")
         self.input_files = core.Dependency(
             source_node=data_node, attribute="input_files"
         )
-
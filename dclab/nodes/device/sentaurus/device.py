@@ -1,10 +1,12 @@
-import subprocess
 import dclab.core as core
-import dclab.utilities.preprocessor as preprocessor
 import dclab.core.decorators as decorators
+import dclab.core.templates as templates
+import dclab.core.tools as tools
 
 
 class Device(core.Node):
+    tool = "sdevice"
+
     def __init__(
         self,
         cmd_template_filename,
@@ -14,6 +16,7 @@ class Device(core.Node):
         current_file="current.plt",
         plot_file="plot.tdr",
         suffix="_device",
+        timeout=None,
     ):
         super(Device, self).__init__()
         self.cmd_template_filename = cmd_template_filename
@@ -24,6 +27,7 @@ class Device(core.Node):
         self.current_file = current_file
         self.plot_file = plot_file
         self.suffix = suffix
+        self.timeout = timeout
 
     def initialize(self, state):
 
@@ -32,29 +36,45 @@ class Device(core.Node):
         self.plot_file = self.sim_dir + self.plot_file
         self.parameter_file = ""
         if self.parameter_template_filename:
-            self.parameter_file = preprocessor.preprocess_file(
+            self.parameter_file = templates.render(
                 filename=self.parameter_template_filename,
                 parameter_dict={**parameter_dict, **self.__dict__},
                 output_directory=self.sim_dir,
                 suffix=self.suffix,
             )
-        self.cmd_filename = preprocessor.preprocess_file(
+        self.cmd_filename = templates.render(
             filename=self.cmd_template_filename,
             parameter_dict={**parameter_dict, **self.__dict__},
             output_directory=self.sim_dir,
             suffix=self.suffix,
         )
 
+    def render_templates(self, states, directories):
+        # The mesh file is only known once the grid node ran, templates using it
+        # are rendered by initialize
+        configuration = {
+            key: value
+            for key, value in self.__dict__.items()
+            if not isinstance(value, core.Dependency)
+        }
+        parameter_dicts = [{**x.to_dict(), **configuration} for x in states]
+        for filename in [self.parameter_template_filename, self.cmd_template_filename]:
+            if filename:
+                templates.render_batch(
+                    filename=filename,
+                    parameter_dicts=parameter_dicts,
+                    output_directories=directories,
+                    suffix=self.suffix,
+                )
+
     @decorators.record_output
     def run(self):
-        exec_command = (
-            "(cd "
-            + self.sim_dir
-            + " && sdevice -rel N-2017.09 "
-            + str(self.cmd_filename)
-            + ")"
+        run_result = tools.run_tool(
+            "sdevice",
+            ["-rel", "N-2017.09", self.cmd_filename],
+            cwd=self.sim_dir,
+            timeout=self.timeout,
         )
-        run_result = subprocess.run(exec_command, shell=True)
         return run_result
 
     def list_dependent_static_files(self):
@@ -64,11 +84,9 @@ class Device(core.Node):
         return static_files
 
     def list_dependent_state_variables(self, state):
-        file_deps = preprocessor.get_dependencies_from_file(self.cmd_template_filename)
+        file_deps = templates.dependencies(self.cmd_template_filename)
         if not (self.parameter_template_filename == None):
-            file_deps += preprocessor.get_dependencies_from_file(
-                self.parameter_template_filename
-            )
+            file_deps += templates.dependencies(self.parameter_template_filename)
         file_deps = [x for x in file_deps if x in state]
         # Removing doubles
         file_deps = list(set(file_deps))
@@ -7,8 +7,14 @@ import dclab.nodes.device.sentaurus.device as device
 
 
 def plt_to_dataframe(plt_content):
+    # Accepts str or bytes, bytes avoid decoding the data block
+    is_bytes = isinstance(plt_content, bytes)
+    data_start = plt_content.index(b"Data {" if is_bytes else "Data {")
+    header = plt_content[:data_start]
+    if is_bytes:
+        header = header.decode()
 
-    s_labels = plt_content.split("]")[0].split("[")[1].replace("\n", " ")
+    s_labels = header.split("]")[0].split("[")[1].replace("\n", " ")
 
     a_labels = (
         re.sub(" +", " ", s_labels)
@@ -18,15 +24,17 @@ def plt_to_dataframe(plt_content):
         .split(",")
     )
 
-    # Convert string to list of strings
-    data = plt_content.split("Data {")[1].replace("}", "").replace("\n", " ")
-    data = re.sub(" +", " ", data).split(" ")
-    data = list(filter(None, data))
+    # Decode the data block in bulk without an intermediate list of strings
+    data_start += len("Data {")
+    data_end = plt_content.rfind(b"}" if is_bytes else "}")
+    if data_end < data_start:
+        data_end = len(plt_content)
+    data = np.fromstring(plt_content[data_start:data_end], sep=" ")
 
     n_columns = len(a_labels)
     assert len(data) % n_columns == 0
     n_rows = int(len(data) / n_columns)
-    data_n = np.asarray(data).astype(float).reshape((n_rows, n_columns))
+    data_n = data.reshape((n_rows, n_columns))
 
     dataframe = pandas.DataFrame(data=data_n, columns=a_labels)
     return dataframe
@@ -45,7 +53,7 @@ class LoadPLT(core.Node):
         self.data = None
 
     def run(self):
-        with open(self.input_file, "r") as f:
+        with open(self.input_file, "rb") as f:
             self.data = plt_to_dataframe(f.read())
         return
 
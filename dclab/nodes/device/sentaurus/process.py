@@ -1,36 +1,45 @@
-import subprocess
-import fluxo.core as core
-import fluxo.core.decorators as decorators
-import fluxo.utilities.preprocessor as preprocessor
+import dclab.core as core
+import dclab.core.decorators as decorators
+import dclab.core.templates as templates
+import dclab.core.tools as tools
 
 
 class Process(core.Node):
-    def __init__(self, cmd_template_filename, suffix="_fps"):
+    tool = "sprocess"
+
+    def __init__(self, cmd_template_filename, suffix="_fps", timeout=None):
         super(Process, self).__init__()
         self.cmd_template_filename = cmd_template_filename
         self.cmd_filename = ""
         self.suffix = suffix
+        self.timeout = timeout
 
     def initialize(self, state):
         parameter_dict = state.to_dict()
         output_directory = state.sim_dir
-        self.cmd_filename = preprocessor.preprocess_file(
+        self.cmd_filename = templates.render(
             filename=self.cmd_template_filename,
             parameter_dict={**parameter_dict, **self.__dict__},
             output_directory=output_directory,
             suffix=self.suffix,
         )
 
+    def render_templates(self, states, directories):
+        templates.render_batch(
+            filename=self.cmd_template_filename,
+            parameter_dicts=[{**x.to_dict(), **self.__dict__} for x in states],
+            output_directories=[x.sim_dir for x in states],
+            suffix=self.suffix,
+        )
+
     @decorators.record_output
     def run(self):
-        exec_command = (
-            "(cd "
-            + self.sim_dir
-            + " && sprocess -rel N-2017.09 "
-            + self.cmd_filename
-            + ")"
+        run_result = tools.run_tool(
+            "sprocess",
+            ["-rel", "N-2017.09", self.cmd_filename],
+            cwd=self.sim_dir,
+            timeout=self.timeout,
         )
-        run_result = subprocess.run(exec_command, shell=True)
         return run_result
 
     def output(self):
@@ -40,6 +49,6 @@ class Process(core.Node):
         return [str(self.cmd_template_filename)]
 
     def list_dependent_state_variables(self, state):
-        file_deps = preprocessor.get_dependencies_from_file(self.cmd_template_filename)
+        file_deps = templates.dependencies(self.cmd_template_filename)
         file_deps = [x for x in file_deps if x in state]
         return file_deps
@@ -1,37 +1,46 @@
-import subprocess
 import os
 import dclab.core as core
-import dclab.utilities.preprocessor as preprocessor
 import dclab.core.decorators as decorators
+import dclab.core.templates as templates
+import dclab.core.tools as tools
 
 
 class SDE(core.Node):
-    def __init__(self, cmd_template_filename, suffix="_sde"):
+    tool = "sde"
+
+    def __init__(self, cmd_template_filename, suffix="_sde", timeout=None):
         super(SDE, self).__init__()
         self.cmd_template_filename = cmd_template_filename
         self.cmd_filename = ""
         self.suffix = suffix
+        self.timeout = timeout
 
     def initialize(self, state):
         parameter_dict = state.to_dict()
         output_directory = self.sim_dir
-        self.cmd_filename = preprocessor.preprocess_file(
+        self.cmd_filename = templates.render(
             filename=self.cmd_template_filename,
             parameter_dict={**parameter_dict, **self.__dict__},
             output_directory=output_directory,
             suffix=self.suffix,
         )
 
+    def render_templates(self, states, directories):
+        templates.render_batch(
+            filename=self.cmd_template_filename,
+            parameter_dicts=[{**x.to_dict(), **self.__dict__} for x in states],
+            output_directories=directories,
+            suffix=self.suffix,
+        )
+
     @decorators.record_output
     def run(self):
-        exec_command = (
-            "(cd "
-            + self.sim_dir
-            + " && sde -rel N-2017.09 -e -2D -l "
-            + str(self.cmd_filename)
-            + ")"
+        run_result = tools.run_tool(
+            "sde",
+            ["-rel", "N-2017.09", "-e", "-2D", "-l", self.cmd_filename],
+            cwd=self.sim_dir,
+            timeout=self.timeout,
         )
-        run_result = subprocess.run(exec_command, shell=True)
         return run_result
 
     def output(self):
@@ -41,6 +50,6 @@ class SDE(core.Node):
         return [str(self.cmd_template_filename)]
 
     def list_dependent_state_variables(self, state):
-        file_deps = preprocessor.get_dependencies_from_file(self.cmd_template_filename)
+        file_deps = templates.dependencies(self.cmd_template_filename)
         file_deps = [x for x in file_deps if x in state]
         return file_deps
@@ -0,0 +1,336 @@
+import concurrent.futures
+import json
+import os
+import threading
+from dclab.core import cache, storage
+
+
+def write_node_state(folder, fingerprint):
+    folder.mkdir(parents=True, exist_ok=True)
+    node_file = folder / "node_state.json"
+    with open(node_file, "w") as f:
+        f.write(json.dumps({"fingerprint": fingerprint, "node_output": {}}))
+    return node_file
+
+
+def add_entries(index, folder, fingerprints):
+    for fingerprint in fingerprints:
+        node_file = write_node_state(folder / fingerprint, fingerprint)
+        index.add("Node", fingerprint, node_file)
+    return len(index)
+
+
+def test_node_index_lookup(tmp_path):
+    index = cache.NodeIndex(tmp_path / "index.jsonl")
+    node_file = write_node_state(tmp_path / "row_0", "a")
+    index.add("Node", "a", node_file)
+    index.add("Node", "a", node_file)
+    assert index.lookup("Node", "a") == node_file
+    assert index.lookup("Node", "b") is None
+    assert index.lookup("Other", "a") is None
+    # Entries are written once and read by new indexes
+    assert len(open(tmp_path / "index.jsonl").readlines()) == 1
+    assert cache.NodeIndex(tmp_path / "index.jsonl").lookup("Node", "a") == node_file
+
+
+def test_node_index_drops_rewritten_folders(tmp_path):
+    index = cache.NodeIndex(tmp_path / "index.jsonl")
+    node_file = write_node_state(tmp_path / "row_0", "a")
+    index.add("Node", "a", node_file)
+    # A later run gives the row other inputs and rewrites the folder
+    write_node_state(tmp_path / "row_0", "b")
+    assert index.lookup("Node", "a") is None
+    assert len(index) == 0
+    # Also when the node state is gone or was not completely written
+    for content in [None, '{"fingerprint": "a"}', '{"fingerprint": "a", "node']:
+        index.add("Node", "a", write_node_state(tmp_path / "row_0", "a"))
+        assert index.lookup("Node", "a") == node_file
+        node_file.unlink()
+        if content is not None:
+            node_file.write_text(content)
+        assert index.lookup("Node", "a") is None
+    # The folder is indexed again once the node ran with the same inputs
+    index.add("Node", "b", write_node_state(tmp_path / "row_0", "b"))
+    assert index.lookup("Node", "b") == node_file
+    assert cache.NodeIndex(tmp_path / "index.jsonl").lookup("Node", "a") is None
+
+
+def test_node_index_skips_partial_lines(tmp_path):
+    filename = tmp_path / "index.jsonl"
+    node_files = [write_node_state(tmp_path / x, x) for x in ["a", "b"]]
+    lines = [
+        json.dumps({"node": "Node", "fingerprint": x, "path": str(y)}) + "\n"
+        for x, y in zip(["a", "b"], node_files)
+    ]
+    # Another row is still writing the second entry
+    filename.write_text(lines[0] + lines[1][:10])
+    index = cache.NodeIndex(filename)
+    assert len(index) == 1
+    assert index.lookup("Node", "b") is None
+    with open(filename, "a") as f:
+        f.write(lines[1][10:])
+    assert index.lookup("Node", "b") == node_files[1]
+    assert len(index) == 2
+
+
+def test_node_index_refresh_across_processes(tmp_path):
+    index = cache.NodeIndex(tmp_path / "index.jsonl")
+    index.add("Node", "a", write_node_state(tmp_path / "a", "a"))
+    fingerprints = [str(x) for x in range(20)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(add_entries, index, tmp_path, fingerprints[i::2])
+            for i in range(2)
+        ]
+        # Workers hold a copy of the index and also read what the other wrote
+        assert all(x.result() >= 11 for x in futures)
+    assert len(index) == 1
+    index.refresh()
+    assert len(index) == 21
+    for fingerprint in fingerprints:
+        node_file = tmp_path / fingerprint / "node_state.json"
+        assert index.lookup("Node", fingerprint) == node_file
+    assert len(open(tmp_path / "index.jsonl").readlines()) == 21
+
+
+class FakeNode(object):
+    def __init__(self, folder, fingerprint, scale=1.0):
+        self.__internal_state__ = {"name": "Node", "scale": scale}
+        self.name = "Node"
+        self.fingerprint = fingerprint
+        self.output_files = [str(folder / "result.txt")]
+        self.node_output = {}
+
+
+def run_node(folder, fingerprint, scale=1.0):
+    # Output file and saved outputs of a node that ran in the folder
+    folder.mkdir(parents=True, exist_ok=True)
+    node = FakeNode(folder, fingerprint, scale=scale)
+    (folder / "result.txt").write_text(fingerprint * 100)
+    manifest = storage.save_outputs({"value": fingerprint}, folder)
+    with open(folder / "node_state.json", "w") as f:
+        f.write(json.dumps({"fingerprint": fingerprint, "node_output": manifest}))
+    return node
+
+
+def set_last_use(result_cache, node, timestamp):
+    entry = result_cache.entry_directory / result_cache.cache_key(node)
+    os.utime(str(entry / "manifest.json"), (timestamp, timestamp))
+
+
+def cached_fingerprints(result_cache):
+    fingerprints = list()
+    for _, _, entry in result_cache.list_entries():
+        manifest = json.loads((entry / "manifest.json").read_text())
+        outputs = storage.load_outputs(manifest["node_output"], entry)
+        fingerprints.append(outputs["value"])
+    return sorted(fingerprints)
+
+
+def test_result_cache_restore(tmp_path):
+    result_cache = cache.ResultCache(tmp_path / "cache")
+    result_cache.store(run_node(tmp_path / "row_0", "a"), tmp_path / "row_0")
+    (tmp_path / "row_1").mkdir()
+    node = FakeNode(tmp_path / "row_1", "a")
+    assert result_cache.restore(node, tmp_path / "row_1")
+    assert node.node_output["value"] == "a"
+    assert node.output_files == [str(tmp_path / "row_1" / "result.txt")]
+    assert (tmp_path / "row_1" / "result.txt").read_text() == "a" * 100
+    # Other fingerprints and other configurations are not restored
+    assert not result_cache.restore(FakeNode(tmp_path, "b"), tmp_path / "row_1")
+    node = FakeNode(tmp_path, "a", scale=2.0)
+    assert not result_cache.restore(node, tmp_path / "row_1")
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    result_cache = cache.ResultCache(tmp_path / "cache", max_entries=2)
+    nodes = {}
+    for i, fingerprint in enumerate(["a", "b"]):
+        folder = tmp_path / fingerprint
+        nodes[fingerprint] = run_node(folder, fingerprint)
+        result_cache.store(nodes[fingerprint], folder)
+        set_last_use(result_cache, nodes[fingerprint], 1000 + i)
+    # Restoring "a" makes "b" the least recently used entry
+    assert result_cache.restore(FakeNode(tmp_path / "a", "a"), tmp_path / "a")
+    result_cache.store(run_node(tmp_path / "c", "c"), tmp_path / "c")
+    assert cached_fingerprints(result_cache) == ["a", "c"]
+    assert not result_cache.restore(FakeNode(tmp_path / "b", "b"), tmp_path / "b")
+
+
+def test_result_cache_max_size(tmp_path):
+    result_cache = cache.ResultCache(tmp_path / "cache")
+    result_cache.store(run_node(tmp_path / "a", "a"), tmp_path / "a")
+    set_last_use(result_cache, FakeNode(tmp_path, "a"), 1000)
+    entry_size = result_cache.size()
+    assert entry_size > 100
+    # Room for two entries, the oldest is removed when a third is stored
+    result_cache.max_size = 2 * entry_size
+    result_cache.store(run_node(tmp_path / "b", "b"), tmp_path / "b")
+    set_last_use(result_cache, FakeNode(tmp_path, "b"), 2000)
+    assert cached_fingerprints(result_cache) == ["a", "b"]
+    result_cache.store(run_node(tmp_path / "c", "c"), tmp_path / "c")
+    assert cached_fingerprints(result_cache) == ["b", "c"]
+    assert result_cache.size() == 2 * entry_size
+    # An entry larger than the cache is not kept at all
+    result_cache.max_size = entry_size - 1
+    result_cache.store(run_node(tmp_path / "d", "d"), tmp_path / "d")
+    assert cached_fingerprints(result_cache) == []
+
+
+def test_result_cache_concurrent_store(tmp_path):
+    result_cache = cache.ResultCache(tmp_path / "cache")
+    nodes = [run_node(tmp_path / str(i), "a") for i in range(8)]
+    barrier = threading.Barrier(len(nodes))
+
+    def store(i):
+        barrier.wait()
+        result_cache.store(nodes[i], tmp_path / str(i))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        list(executor.map(store, range(len(nodes))))
+    assert cached_fingerprints(result_cache) == ["a"]
+    # Rows that lost the race leave no temporary entries behind
+    assert sorted(x.name for x in (tmp_path / "cache").iterdir()) == [
+        "cache.lock",
+        "entries",
+    ]
+    node = FakeNode(tmp_path / "restored", "a")
+    (tmp_path / "restored").mkdir()
+    assert result_cache.restore(node, tmp_path / "restored")
+    assert node.node_output["value"] == "a"
+
+
+def test_result_cache_store_race(tmp_path, monkeypatch):
+    result_cache = cache.ResultCache(tmp_path / "cache")
+    nodes = [run_node(tmp_path / str(i), "a") for i in range(2)]
+    locked = result_cache.locked
+    raced = list()
+
+    def store_other_first(shared=False):
+        # The other row stores the same entry while this one copies its files
+        if not shared and not raced:
+            raced.append(True)
+            result_cache.store(nodes[1], tmp_path / "1")
+        return locked(shared=shared)
+
+    monkeypatch.setattr(result_cache, "locked", store_other_first)
+    result_cache.store(nodes[0], tmp_path / "0")
+    assert raced
+    assert cached_fingerprints(result_cache) == ["a"]
+    assert len(list((tmp_path / "cache").glob("tmp_*"))) == 0
+
+
+def test_object_store_links_equal_files(tmp_path):
+    store = cache.ObjectStore(tmp_path / "store")
+    filenames = [tmp_path / x for x in ["a.txt", "b.txt", "c.txt"]]
+    for filename, content in zip(filenames, ["same", "same", "other"]):
+        filename.write_text(content)
+    objects = store.add_files([str(x) for x in filenames] + [str(tmp_path / "x")])
+    assert objects[0] == objects[1] != objects[2]
+    assert len(store.list_objects()) == 2
+    assert store.size() == len("same") + len("other")
+    for filename, object_file in zip(filenames, objects):
+        assert filename.samefile(object_file)
+    assert objects[0].stat().st_nlink == 3
+    assert objects[2].stat().st_nlink == 2
+    # Adding a linked file again changes nothing
+    assert store.add(filenames[0]) == objects[0]
+    assert objects[0].stat().st_nlink == 3
+    assert filenames[0].read_text() == "same"
+
+
+def test_object_store_protects_objects(tmp_path):
+    store = cache.ObjectStore(tmp_path / "store")
+    linked = tmp_path / "linked.txt"
+    linked.write_text("linked")
+    object_file = store.add(linked)
+    # Objects and the files linked to them are read-only
+    assert object_file.stat().st_mode & 0o777 == 0o444
+    assert linked.stat().st_mode & 0o777 == 0o444
+    # Files written by nodes are kept, only links to objects are removed
+    written = tmp_path / "written.txt"
+    written.write_text("written")
+    os.link(str(written), str(tmp_path / "written_link.txt"))
+    cache.ObjectStore.detach(tmp_path)
+    assert not linked.exists()
+    assert written.read_text() == "written"
+    assert (tmp_path / "written_link.txt").exists()
+    # A new file in place of the link leaves the object unchanged
+    linked.write_text("changed")
+    assert object_file.read_text() == "linked"
+    assert object_file.stat().st_nlink == 1
+
+
+def test_object_store_collect(tmp_path):
+    store = cache.ObjectStore(tmp_path / "store")
+    filenames = [tmp_path / x for x in ["a.txt", "b.txt", "c.txt"]]
+    for filename, content in zip(filenames, ["same", "same", "other"]):
+        filename.write_text(content)
+    objects = store.add_files(filenames)
+    assert store.collect() == (0, 0)
+    # Objects are removed once no run folder links to them anymore
+    filenames[0].unlink()
+    filenames[2].unlink()
+    assert store.collect() == (1, len("other"))
+    assert store.list_objects() == [objects[0]]
+    filenames[1].unlink()
+    assert store.collect() == (1, len("same"))
+    assert store.list_objects() == []
+
+
+def convert(workspace, content):
+    # Files written by a conversion tool
+    filenames = [workspace / "dev.grd", workspace / "dev.dat"]
+    for filename in filenames:
+        filename.write_text(content + filename.suffix)
+    return filenames
+
+
+def test_conversion_cache_store_and_restore(tmp_path):
+    conversion_cache = cache.ConversionCache(tmp_path / "cache")
+    source = tmp_path / "dev.tdr"
+    source.write_text("tdr")
+    key = conversion_cache.cache_key(source, ["-grd", 1])
+    assert key != conversion_cache.cache_key(source, ["-grd", 2])
+    assert conversion_cache.restore(key, tmp_path) is None
+    with conversion_cache.workspace() as workspace:
+        conversion_cache.store(key, convert(workspace, "first"))
+    assert list((tmp_path / "cache").glob("tmp_*")) == []
+    # Existing files in the run folder are replaced by links to the entry
+    (tmp_path / "run").mkdir()
+    (tmp_path / "run" / "dev.grd").write_text("old")
+    restored = conversion_cache.restore(key, tmp_path / "run")
+    assert sorted(x.name for x in restored) == ["dev.dat", "dev.grd"]
+    assert (tmp_path / "run" / "dev.grd").read_text() == "first.grd"
+    entry = conversion_cache.entry_directory / key
+    for filename in restored:
+        assert filename.samefile(entry / filename.name)
+        assert filename.stat().st_mode & 0o777 == 0o444
+    # Other content gives another key
+    source.write_text("other tdr")
+    assert conversion_cache.cache_key(source, ["-grd", 1]) != key
+    conversion_cache.clear()
+    assert conversion_cache.restore(key, tmp_path / "run") is None
+
+
+def test_conversion_cache_store_race(tmp_path, monkeypatch):
+    conversion_cache = cache.ConversionCache(tmp_path / "cache")
+    link_file = cache.link_file
+    raced = list()
+
+    def store_other_first(source, target):
+        # Another row stores the same conversion while this one links its files
+        if not raced:
+            raced.append(True)
+            with conversion_cache.workspace() as workspace:
+                conversion_cache.store("key", convert(workspace, "other"))
+        return link_file(source, target)
+
+    monkeypatch.setattr(cache, "link_file", store_other_first)
+    with conversion_cache.workspace() as workspace:
+        conversion_cache.store("key", convert(workspace, "first"))
+    assert raced
+    # The entry of the other row is kept and nothing is left behind
+    restored = conversion_cache.restore("key", tmp_path)
+    assert sorted(x.read_text() for x in restored) == ["other.dat", "other.grd"]
+    assert sorted(x.name for x in (tmp_path / "cache").iterdir()) == ["entries"]
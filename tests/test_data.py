@@ -0,0 +1,145 @@
+import pandas as pd
+from dclab.core import data
+
+
+def test_result_writer_appends_rows(tmp_path):
+    writer = data.ResultWriter(tmp_path / "output.csv")
+    writer.append(index=0, row={"a": 1.0, "b": "x"})
+    writer.append(index=1, row={"a": 2.0, "b": "y"})
+    writer.finalize()
+    frame = writer.read()
+    assert frame.index.tolist() == [0, 1]
+    assert frame["a"].tolist() == [1.0, 2.0]
+    assert frame["b"].tolist() == ["x", "y"]
+
+
+def test_result_writer_column_union(tmp_path):
+    filename = tmp_path / "output.csv"
+    writer = data.ResultWriter(filename)
+    writer.append(index=0, row={"a": 1.0, "label": "007"})
+    writer.append(index=1, row={"a": 2.0, "c": 3.0})
+    writer.append(index=2, row={"label": "1.10"})
+    written = pd.read_csv(filename, index_col=0, dtype=str, keep_default_na=False)
+    assert written.columns.tolist() == ["a", "label", "c"]
+    # Rows written before the new column was added are kept as they were
+    assert written["label"].tolist() == ["007", "", "1.10"]
+    assert written["a"].tolist() == ["1.0", "2.0", ""]
+    assert written["c"].tolist() == ["", "3.0", ""]
+
+
+def test_result_writer_sorts_out_of_order_rows(tmp_path):
+    filename = tmp_path / "output.csv"
+    writer = data.ResultWriter(filename)
+    for index in [2, 0, 10, 1]:
+        writer.append(index=index, row={"a": float(index), "label": "0.0"})
+    assert not writer.is_sorted
+    writer.finalize()
+    assert writer.is_sorted
+    written = pd.read_csv(filename, index_col=0, dtype=str)
+    assert written.index.tolist() == [0, 1, 2, 10]
+    assert written["label"].tolist() == ["0.0"] * 4
+
+
+def test_result_writer_reset(tmp_path):
+    filename = tmp_path / "output.csv"
+    writer = data.ResultWriter(filename)
+    writer.append(index=0, row={"a": 1.0})
+    writer.reset()
+    assert not filename.exists()
+    writer.append(index=0, row={"b": 1.0})
+    assert writer.read().columns.tolist() == ["b"]
+
+
+def write_doe(directory, n_rows=25):
+    filename = directory / "doe.csv"
+    pd.DataFrame(
+        {
+            "a": range(n_rows),
+            "b": [0.5 * x for x in range(n_rows)],
+            "name": ["r{}".format(x) for x in range(n_rows)],
+        }
+    ).to_csv(filename, index=False)
+    return filename
+
+
+def build_memories(directory, n_rows=25):
+    # The same rows in memory and streamed in chunks of four rows
+    filename = write_doe(directory, n_rows=n_rows)
+    memory = data.SimulationMemory()
+    streaming = data.StreamingSimulationMemory(chunk_size=4, max_chunks=2)
+    for state in [memory, streaming]:
+        state.load_defaults({"a": 0, "b": 0.0, "name": "", "c": "default"})
+        state.load_doe(filename)
+        state.add_data_to_all_rows("version", 1.5)
+    memory.set_column("d", [2 * x for x in range(n_rows)])
+    streaming.set_column("d", lambda x: 2 * x)
+    return memory, streaming
+
+
+def loaded_chunks(streaming):
+    return list(streaming._StreamingSimulationMemory__chunks)
+
+
+def test_streaming_memory_matches_memory(tmp_path):
+    memory, streaming = build_memories(tmp_path)
+    assert streaming.size() == memory.size() == 25
+    for index in [24, 0, 13, 12, 5, 24]:
+        pd.testing.assert_series_equal(
+            streaming.get_row(index), memory.get_row(index), check_names=False
+        )
+        assert streaming.get_value("d", index) == memory.get_value("d", index)
+    pd.testing.assert_series_equal(
+        streaming.get_column("name"), memory.get_column("name")
+    )
+    for state in [memory, streaming]:
+        state.add_data_at_index("result", 3.5, index=7)
+        state.add_data_at_index("c", "changed", index=21)
+    memory.export_to_csv(tmp_path / "memory.csv")
+    streaming.export_to_csv(tmp_path / "streaming.csv")
+    assert (tmp_path / "memory.csv").read_text() == (
+        tmp_path / "streaming.csv"
+    ).read_text()
+
+
+def test_streaming_memory_evicts_chunks(tmp_path, monkeypatch):
+    _, streaming = build_memories(tmp_path)
+    read_csv = pd.read_csv
+    calls = list()
+
+    def counting_read_csv(*args, **kwargs):
+        calls.append(kwargs.get("skiprows"))
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+    # Rows in order continue one reader, only the last two chunks are kept
+    for index in range(25):
+        assert streaming.get_value("a", index) == index
+    assert len(calls) == 1
+    assert loaded_chunks(streaming) == [5, 6]
+    # Other chunks are read again, starting at their first row
+    assert streaming.get_value("name", 9) == "r9"
+    assert streaming.get_value("d", 2) == 4
+    assert loaded_chunks(streaming) == [2, 0]
+    assert [list(x) for x in calls[1:]] == [list(range(1, 9)), []]
+    assert streaming.get_value("b", 24) == 12.0
+    assert loaded_chunks(streaming) == [0, 6]
+
+
+def test_streaming_memory_keeps_overrides(tmp_path):
+    _, streaming = build_memories(tmp_path)
+    streaming.get_row(1)
+    # Values set on a loaded chunk and on a chunk that was not read yet
+    streaming.add_data_at_index("b", 99.0, index=1)
+    streaming.add_data_at_index("result", "x", index=22)
+    assert streaming.get_value("b", 1) == 99.0
+    for index in [8, 12, 16, 22]:
+        streaming.get_row(index)
+    assert 0 not in loaded_chunks(streaming)
+    assert streaming.get_value("b", 1) == 99.0
+    assert streaming.get_value("result", 22) == "x"
+    assert pd.isna(streaming.get_value("result", 21))
+    # Columns set for all rows drop the chunks, overrides are applied again
+    streaming.set_column("d", 0)
+    assert loaded_chunks(streaming) == []
+    assert streaming.get_value("b", 1) == 99.0
+    assert streaming.get_value("d", 1) == 0
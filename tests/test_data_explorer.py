@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dclab.nodes.device.sentaurus import data_explorer
+from benchmarks import generators, legacy
+
+
+def format_values(values, template):
+    # Eight values per line like in DF-ISE files
+    lines = [
+        " ".join(template.format(x) for x in values[i : i + 8])
+        for i in range(0, len(values), 8)
+    ]
+    return " " + "\n ".join(lines) + "\n"
+
+
+def random_values(n_values):
+    random = np.random.RandomState(0)
+    values = random.standard_normal(n_values) * 10.0 ** random.randint(
+        -40, 40, n_values
+    )
+    values[:4] = [0.0, -1.0, 1e-30, 9.999999999999999e22]
+    return values
+
+
+@pytest.mark.parametrize("template", ["{:.8e}", "{:.15e}", "{:.1e}"])
+def test_decode_scientific_matches_fromstring(template):
+    text = format_values(random_values(100000), template).encode()
+    block = data_explorer._PADDING + text + data_explorer._PADDING
+    values = data_explorer.decode_scientific(block, 100000, chunk_size=1000)
+    expected = np.fromstring(text, sep=" ")
+    assert values is not None
+    np.testing.assert_array_equal(values, expected)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "1.5 2.0e+00",
+        "1.0e+00 2.00e+00",
+        "1.0E+00 2.0E+00",
+        "1.0e+100 2.0e+00",
+        "1.0e+00 2.0e+00 3",
+    ],
+)
+def test_decode_datasets_other_formats(text):
+    dat = data_explorer._PADDING + text.encode() + data_explorer._PADDING
+    count = len(text.split())
+    assert data_explorer.decode_scientific(dat, count) is None
+    datasets = [{"count": count, "values": (0, len(dat))}]
+    values = data_explorer.decode_datasets(dat, datasets)[0]
+    np.testing.assert_array_equal(values, np.fromstring(text, sep=" "))
+
+
+def test_decode_scientific_rejects_other_characters():
+    dat = data_explorer._PADDING + b"1.0e+00 x 2.0e+00" + data_explorer._PADDING
+    assert data_explorer.decode_scientific(dat, 2) is None
+
+
+def test_decode_datasets_mismatched_count():
+    dat = b" 1.0e+00 2.0e+00 | 3.0e+00 |"
+    datasets = [{"count": 2, "values": (0, 17)}, {"count": 2, "values": (18, 26)}]
+    values = data_explorer.decode_datasets(dat, datasets)
+    np.testing.assert_array_equal(values[0], [1.0, 2.0])
+    np.testing.assert_array_equal(values[1], [3.0])
+
+
+def test_parse_dfise_str_matches_legacy():
+    grd, dat = generators.generate_dfise(1000, n_regions=3, n_parameters=4)
+    frame = data_explorer.parse_dfise_str(grd, dat, dense_regions=True)
+    legacy_frame = legacy.parse_dfise_str(grd, dat)[frame.columns]
+    parameters = [x for x in frame.columns if x.startswith("Parameter_")]
+    # Parameters are decoded exactly, like float() in the legacy parser
+    pd.testing.assert_frame_equal(
+        frame[parameters], legacy_frame[parameters], check_exact=True
+    )
+    pd.testing.assert_frame_equal(frame, legacy_frame)
@@ -0,0 +1,60 @@
+import copy
+from dclab.core import dependency
+
+
+class FakeNode(object):
+    def __init__(self, **kwargs):
+        self.node_output = kwargs
+
+
+def test_get():
+    source = FakeNode(x=1.0)
+    assert dependency.Dependency(source, "x").get() == 1.0
+    assert str(dependency.Dependency(source, "x")) == "1.0"
+
+
+def test_deepcopy_rebinds_copied_source():
+    source = FakeNode(x=1.0)
+    target = FakeNode(x=dependency.Dependency(source, "x"))
+    copied_source, copied_target = copy.deepcopy([source, target])
+    copied_dependency = copied_target.node_output["x"]
+    assert copied_dependency is not target.node_output["x"]
+    assert copied_dependency.source_node is copied_source
+    copied_source.node_output["x"] = 2.0
+    assert copied_dependency.get() == 2.0
+    assert target.node_output["x"].get() == 1.0
+
+
+def test_deepcopy_shares_uncopied_source():
+    source = FakeNode(x=1.0)
+    target = FakeNode(x=dependency.FileDependency(source, file_filter="a"))
+    copied_target = copy.deepcopy(target)
+    assert copied_target.node_output["x"] is target.node_output["x"]
+    assert copied_target.node_output["x"].source_node is source
+
+
+def test_fingerprint_keys_parents_by_attribute():
+    dependencies = {"state_variables": {}, "static_files": [], "nodes": ["a", "b"]}
+    parent_fingerprints = {"a": "1", "b": "2"}
+
+    def fingerprint(reference, target):
+        sources = {
+            "reference": {"node": reference, "attribute": "value"},
+            "target": {"node": target, "attribute": "value"},
+        }
+        return dependency.fingerprint_dependencies(
+            dependencies, parent_fingerprints, sources=sources
+        )
+
+    assert fingerprint("a", "b") == fingerprint("a", "b")
+    assert fingerprint("a", "b") != fingerprint("b", "a")
+
+
+def test_configuration():
+    source = FakeNode()
+    assert dependency.Dependency(source, "x").configuration() == {"attribute": "x"}
+    assert dependency.FileDependency(source, file_filter="a").configuration() == {
+        "attribute": "output_files",
+        "file_filter": "a",
+        "select_id": 0,
+    }
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from dclab.core import journal
+
+
+def test_record_and_read(tmp_path):
+    completion_journal = journal.CompletionJournal(tmp_path / "journal.jsonl")
+    completion_journal.record(np.int64(0), "key_0", {"x": np.float64(1.5)})
+    completion_journal.record(1, "key_1", {"x": "007"})
+    entries = completion_journal.read()
+    assert entries[0] == {"row": 0, "key": "key_0", "output": {"x": 1.5}}
+    assert entries[1]["output"] == {"x": "007"}
+
+
+def test_outputs_json_cannot_encode_are_pickled(tmp_path):
+    completion_journal = journal.CompletionJournal(
+        tmp_path / "journal.jsonl", fsync=False
+    )
+    frame = pd.DataFrame({"a": [1.0, 2.0]})
+    completion_journal.record(0, "key", {"frame": frame})
+    output = completion_journal.read()[0]["output"]
+    pd.testing.assert_frame_equal(output["frame"], frame)
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    completion_journal = journal.CompletionJournal(filename)
+    completion_journal.record(0, "key", {"x": 1})
+    completion_journal.record(1, "key", {"x": 2})
+    content = filename.read_bytes()
+    filename.write_bytes(content[:-5])
+    assert list(completion_journal.read()) == [0]
+
+
+def test_reset(tmp_path):
+    completion_journal = journal.CompletionJournal(tmp_path / "journal.jsonl")
+    completion_journal.record(0, "key", {"x": 1})
+    completion_journal.reset()
+    assert completion_journal.read() == {}
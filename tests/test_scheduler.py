@@ -0,0 +1,159 @@
+import threading
+import time
+import pytest
+from dclab.core import scheduler
+
+
+class FakeLicensePool(object):
+    # Hands out a limited number of tokens and records how many were used at once
+    def __init__(self, limits, refused=0):
+        self.limits = dict(limits)
+        self.in_use = {tool: 0 for tool in self.limits}
+        self.max_in_use = {tool: 0 for tool in self.limits}
+        # Tokens held by someone else for the first attempts
+        self.refused = refused
+        self.attempts = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tool):
+        if tool not in self.limits:
+            return True
+        with self.lock:
+            self.attempts += 1
+            if self.attempts <= self.refused:
+                return False
+            if self.in_use[tool] >= self.limits[tool]:
+                return False
+            self.in_use[tool] += 1
+            self.max_in_use[tool] = max(self.max_in_use[tool], self.in_use[tool])
+            return True
+
+    def release(self, tool):
+        if tool not in self.limits:
+            return
+        with self.lock:
+            self.in_use[tool] -= 1
+
+
+class Recorder(object):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.started = list()
+        self.finished = {}
+        self.active_rows = 0
+        self.max_active_rows = 0
+        self.lock = threading.Lock()
+
+    def start_row(self, row_id):
+        self.active_rows += 1
+        self.max_active_rows = max(self.max_active_rows, self.active_rows)
+
+        def run_node(node_id):
+            with self.lock:
+                self.started.append((row_id, node_id))
+            time.sleep(self.delay)
+            return "{}-{}".format(row_id, node_id)
+
+        return run_node
+
+    def finish_row(self, row_id, outputs):
+        self.active_rows -= 1
+        self.finished[row_id] = outputs
+
+
+def test_license_pool():
+    pool = scheduler.LicensePool({"sdevice": 1})
+    assert pool.try_acquire("sdevice")
+    assert not pool.try_acquire("sdevice")
+    assert pool.try_acquire("sprocess")
+    pool.release("sdevice")
+    pool.release("sprocess")
+    assert pool.try_acquire("sdevice")
+    assert pool.total() == 1
+
+
+def test_critical_path_lengths():
+    graph = [[], [0], [1], [0]]
+    assert scheduler.critical_path_lengths(graph) == [3.0, 2.0, 1.0, 1.0]
+    lengths = scheduler.critical_path_lengths(graph, [1.0, 1.0, 1.0, 5.0])
+    assert lengths == [6.0, 2.0, 1.0, 5.0]
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        scheduler.JobScheduler([[]], priority="random")
+
+
+def test_nodes_run_after_their_parents():
+    graph = [[], [0], [0], [1, 2]]
+    recorder = Recorder()
+    job_scheduler = scheduler.JobScheduler(graph, max_workers=3)
+    job_scheduler.run(4, recorder.start_row, recorder.finish_row)
+    assert sorted(recorder.finished) == [0, 1, 2, 3]
+    for row_id, outputs in recorder.finished.items():
+        assert outputs == ["{}-{}".format(row_id, x) for x in range(4)]
+        order = [node_id for row, node_id in recorder.started if row == row_id]
+        for node_id, parents in enumerate(graph):
+            for parent_id in parents:
+                assert order.index(parent_id) < order.index(node_id)
+
+
+@pytest.mark.parametrize(
+    "priority, expected_runtimes, first_node",
+    [
+        ("critical_path", None, 0),
+        ("critical_path", {"sdevice": 10.0}, 3),
+        ("shortest_runtime", {"sprocess": 5.0}, 3),
+    ],
+)
+def test_priorities(priority, expected_runtimes, first_node):
+    # Node 0 starts a chain of three nodes, node 3 stands alone
+    graph = [[], [0], [1], []]
+    recorder = Recorder()
+    job_scheduler = scheduler.JobScheduler(
+        graph,
+        tools=["sprocess", None, None, "sdevice"],
+        priority=priority,
+        expected_runtimes=expected_runtimes,
+    )
+    job_scheduler.run(1, recorder.start_row, recorder.finish_row)
+    assert recorder.started[0] == (0, first_node)
+
+
+def test_tokens_bound_concurrency():
+    graph = [[], [0], [0]]
+    tools = [None, "sdevice", "sdevice"]
+    pool = FakeLicensePool({"sdevice": 1})
+    recorder = Recorder(delay=0.05)
+    job_scheduler = scheduler.JobScheduler(
+        graph, tools=tools, license_pool=pool, max_workers=4, poll_interval=0.01
+    )
+    job_scheduler.run(3, recorder.start_row, recorder.finish_row)
+    assert sorted(recorder.finished) == [0, 1, 2]
+    assert pool.max_in_use["sdevice"] == 1
+    assert pool.in_use["sdevice"] == 0
+
+
+def test_waits_for_tokens_held_elsewhere():
+    pool = FakeLicensePool({"sdevice": 1}, refused=3)
+    recorder = Recorder()
+    job_scheduler = scheduler.JobScheduler(
+        [[]], tools=["sdevice"], license_pool=pool, poll_interval=0.01
+    )
+    job_scheduler.run(1, recorder.start_row, recorder.finish_row)
+    assert recorder.finished == {0: ["0-0"]}
+    assert pool.attempts == 4
+
+
+def test_rows_started_lazily():
+    recorder = Recorder(delay=0.01)
+    job_scheduler = scheduler.JobScheduler([[], [0]], max_workers=2, max_active_rows=2)
+    job_scheduler.run(6, recorder.start_row, recorder.finish_row)
+    assert sorted(recorder.finished) == list(range(6))
+    assert recorder.max_active_rows == 2
+
+
+def test_without_nodes():
+    recorder = Recorder()
+    scheduler.JobScheduler([]).run(2, recorder.start_row, recorder.finish_row)
+    assert recorder.finished == {0: [], 1: []}
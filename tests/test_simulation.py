@@ -0,0 +1,289 @@
+import concurrent.futures
+import hashlib
+import os
+import time
+import pandas as pd
+import pytest
+import dclab.core as core
+from dclab.core import storage, trace
+
+
+class Source(core.Node):
+    def list_dependent_state_variables(self, state):
+        return ["a"]
+
+    def initialize(self, state):
+        self.a = state["a"]
+
+    def run(self):
+        self.node_output["data"] = pd.DataFrame({"v": [self.a] * 3})
+
+    def output(self):
+        return {"src": self.node_output["data"]["v"].sum()}
+
+
+class Sink(core.Node):
+    def __init__(self, source):
+        super(Sink, self).__init__()
+        self.data = core.Dependency(source_node=source, attribute="data")
+
+    def list_dependent_state_variables(self, state):
+        return ["b"]
+
+    def initialize(self, state):
+        self.b = state["b"]
+
+    def run(self):
+        self.node_output["result"] = self.data["v"].sum() * self.b
+
+    def output(self):
+        return {"sink": self.node_output["result"]}
+
+
+def build_simulation(directory, **kwargs):
+    doe_filename = directory / "doe.csv"
+    pd.DataFrame({"a": [1, 1, 2, 2], "b": [1, 2, 1, 1]}).to_csv(
+        doe_filename, index=False
+    )
+    simulation = core.Simulation(doe_filename=str(doe_filename), **kwargs)
+    simulation.add_node(Sink(Source()))
+    return simulation
+
+
+@pytest.mark.parametrize("backend", sorted(storage.BACKENDS))
+def test_load_results(tmp_path, backend):
+    requires = storage.BACKENDS[backend].requires
+    if requires is not None:
+        pytest.importorskip(requires)
+    simulation = build_simulation(tmp_path, storage_backend=backend)
+    simulation.run_simulation()
+    results = simulation.load_results(columns=["src", "sink"])
+    assert results["src"].tolist() == [3, 3, 6, 6]
+    assert results["sink"].tolist() == [3, 6, 6, 6]
+
+
+class Label(core.Node):
+    def __init__(self, source):
+        super(Label, self).__init__()
+        self.data = core.Dependency(source_node=source, attribute="data")
+
+    def output(self):
+        return {"label": ["0.0", "007", "1.10", "x"][self.data["v"].iloc[0]]}
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_frequent_output_keeps_types(tmp_path, max_workers):
+    frames = list()
+    for frequent_output in [True, False]:
+        directory = tmp_path / str(frequent_output)
+        directory.mkdir()
+        simulation = build_simulation(
+            directory, frequent_output=frequent_output, max_workers=max_workers
+        )
+        simulation.add_node(Label(simulation.nodes[0].data.source_node))
+        simulation.run_simulation()
+        frames.append(simulation.output_frame.drop(columns=["base_dir", "sim_dir"]))
+    pd.testing.assert_frame_equal(frames[0], frames[1])
+    assert frames[0]["label"].tolist() == ["007", "007", "1.10", "1.10"]
+    written = pd.read_csv(tmp_path / "True" / "doe" / "output.csv", dtype=str)
+    assert written["label"].tolist() == ["007", "007", "1.10", "1.10"]
+
+
+class SlowSource(Source):
+    def run(self):
+        # Gives other rows time to run on the same nodes
+        time.sleep(0.05)
+        super(SlowSource, self).run()
+
+
+def test_thread_pool_executor(tmp_path):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        simulation = build_simulation(tmp_path, executor=executor)
+        simulation.nodes = [Sink(SlowSource())]
+        simulation.run_simulation()
+    results = simulation.output_frame
+    assert results["src"].tolist() == [3, 3, 6, 6]
+    assert results["sink"].tolist() == [3, 6, 6, 6]
+
+
+class Constant(core.Node):
+    def __init__(self, value):
+        super(Constant, self).__init__()
+        self.value = value
+
+    def run(self):
+        self.node_output["value"] = self.value
+
+
+class Difference(core.Node):
+    def __init__(self, reference, target):
+        super(Difference, self).__init__()
+        self.reference = core.Dependency(source_node=reference, attribute="value")
+        self.target = core.Dependency(source_node=target, attribute="value")
+
+    def run(self):
+        self.node_output["difference"] = self.target - self.reference
+
+    def output(self):
+        return {"difference": self.node_output["difference"]}
+
+
+def test_result_cache_tells_swapped_parents_apart(tmp_path):
+    differences = list()
+    for name, swapped in [("first", False), ("second", True)]:
+        simulation = build_simulation(
+            tmp_path, simulation_name=name, cache_directory=str(tmp_path / "cache")
+        )
+        first, second = Constant(1.0), Constant(2.0)
+        if swapped:
+            simulation.nodes = [Difference(second, first)]
+        else:
+            simulation.nodes = [Difference(first, second)]
+        simulation.run_simulation()
+        differences.append(simulation.output_frame["difference"].tolist())
+    assert differences == [[1.0] * 4, [-1.0] * 4]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class CountingSink(Sink):
+    # Rows run by the class, and the b value after which a run is interrupted
+    runs = list()
+    interrupt_at = None
+
+    def run(self):
+        if self.b == CountingSink.interrupt_at:
+            raise Interrupted()
+        CountingSink.runs.append(self.b)
+        super(CountingSink, self).run()
+
+
+@pytest.fixture
+def counting_sink():
+    CountingSink.runs = list()
+    CountingSink.interrupt_at = None
+    yield CountingSink
+
+
+def run_interrupted(directory, counting_sink):
+    # The third row of build_simulation is the first with b == 1 after b == 2
+    counting_sink.interrupt_at = 2
+    simulation = build_simulation(directory, allow_execution_skipping=False)
+    simulation.nodes = [counting_sink(Source())]
+    with pytest.raises(Interrupted):
+        simulation.run_simulation()
+    assert counting_sink.runs == [1]
+    counting_sink.runs = list()
+    counting_sink.interrupt_at = None
+
+
+def test_resume_after_interruption(tmp_path, counting_sink):
+    run_interrupted(tmp_path, counting_sink)
+    # Without execution skipping only the journal keeps rows from running again
+    simulation = build_simulation(tmp_path, resume=True, allow_execution_skipping=False)
+    simulation.nodes = [counting_sink(Source())]
+    simulation.run_simulation()
+    # Only the interrupted row and the rows after it are run again
+    assert counting_sink.runs == [2, 1, 1]
+    assert simulation.output_frame["sink"].tolist() == [3, 6, 6, 6]
+    assert simulation.load_results()["sink"].tolist() == [3, 6, 6, 6]
+
+
+def test_resume_skips_truncated_journal_line(tmp_path, counting_sink):
+    run_interrupted(tmp_path, counting_sink)
+    journal_filename = tmp_path / "doe" / "journal.jsonl"
+    # The first row was being written when the run was killed
+    content = journal_filename.read_bytes()
+    journal_filename.write_bytes(content[: len(content) // 2])
+    simulation = build_simulation(tmp_path, resume=True, allow_execution_skipping=False)
+    simulation.nodes = [counting_sink(Source())]
+    simulation.run_simulation()
+    assert counting_sink.runs == [1, 2, 1, 1]
+    assert simulation.output_frame["sink"].tolist() == [3, 6, 6, 6]
+
+
+def test_resume_without_journal_runs_everything(tmp_path, counting_sink):
+    simulation = build_simulation(tmp_path, resume=True, allow_execution_skipping=False)
+    simulation.nodes = [counting_sink(Source())]
+    simulation.run_simulation()
+    assert counting_sink.runs == [1, 2, 1, 1]
+
+
+class Report(Sink):
+    def run(self):
+        super(Report, self).run()
+        filename = os.path.join(self.sim_dir, "report.txt")
+        with open(filename, "w") as f:
+            f.write("result {}".format(self.node_output["result"]))
+        self.output_files.append(filename)
+
+
+def list_reports(directory):
+    reports = {}
+    for object_file in directory.glob("doe/object_store/objects/*/*"):
+        # Objects are never changed through the links in the run folders
+        content = object_file.read_bytes()
+        assert hashlib.sha256(content).hexdigest() == object_file.name
+        if content.startswith(b"result"):
+            reports[content.decode()] = object_file.stat().st_nlink
+    return reports
+
+
+def test_deduplicated_reports(tmp_path):
+    simulation = build_simulation(tmp_path, deduplicate_outputs=True)
+    simulation.nodes = [Report(Source())]
+    simulation.run_simulation()
+    # Rows 1 and 2 write the same report, row 3 is taken from row 2
+    assert list_reports(tmp_path) == {"result 3": 2, "result 6": 3}
+
+
+def test_deduplicated_reports_collected_after_clean_up(tmp_path):
+    simulation = build_simulation(tmp_path, deduplicate_outputs=True)
+    report = Report(Source())
+    report.clean_up_output = True
+    simulation.nodes = [report]
+    simulation.run_simulation()
+    assert list(tmp_path.glob("doe/run_*/01_Report/report.txt")) == []
+    assert list_reports(tmp_path) == {}
+    # Saved outputs are still linked from the run folders
+    assert simulation.collect_garbage() == (0, 0)
+    assert simulation.output_frame["sink"].tolist() == [3, 6, 6, 6]
+
+
+def test_rerun_in_folders_with_deduplicated_reports(tmp_path):
+    simulation = build_simulation(tmp_path, deduplicate_outputs=True)
+    simulation.nodes = [Report(Source())]
+    simulation.run_simulation()
+    # The second run gives every row b == 3, so all reports are written again
+    pd.DataFrame({"a": [1, 1, 2, 2], "b": [3, 3, 3, 3]}).to_csv(
+        tmp_path / "doe.csv", index=False
+    )
+    simulation = core.Simulation(
+        doe_filename=str(tmp_path / "doe.csv"),
+        clean_slate=False,
+        deduplicate_outputs=True,
+    )
+    simulation.nodes = [Report(Source())]
+    simulation.run_simulation()
+    assert simulation.output_frame["sink"].tolist() == [9, 9, 18, 18]
+    reports = tmp_path.glob("doe/run_*/01_Report/report.txt")
+    assert sorted(x.read_text() for x in reports) == ["result 18", "result 9"]
+    # Reports of the first run are no longer linked and were collected
+    assert list_reports(tmp_path) == {"result 9": 2, "result 18": 2}
+
+
+def test_instrumentation(tmp_path, capsys):
+    simulation = build_simulation(tmp_path)
+    simulation.run_simulation()
+    assert not (tmp_path / "doe" / "trace.jsonl").exists()
+    assert not (tmp_path / "doe" / "report.txt").exists()
+    assert "add_row_to_output" not in capsys.readouterr().out
+    simulation = build_simulation(tmp_path, instrumentation=True)
+    simulation.run_simulation()
+    events = trace.load_trace(tmp_path / "doe" / "trace.jsonl")
+    assert len([x for x in events if x["name"] == "row"]) == 4
+    report = (tmp_path / "doe" / "report.txt").read_text()
+    assert "add_row_to_output" in report
+    assert report in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from dclab.core import storage
+
+
+@pytest.fixture(params=sorted(storage.BACKENDS))
+def backend(request):
+    requires = storage.BACKENDS[request.param].requires
+    if requires is not None:
+        pytest.importorskip(requires)
+    return storage.get_backend(request.param)
+
+
+def example_frame():
+    return pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": ["x", "y", "z"], "c": [1, 2, 3]})
+
+
+def test_round_trip(tmp_path, backend):
+    filename = tmp_path / ("frame" + backend.extension)
+    frame = example_frame()
+    assert backend.supports(frame)
+    backend.write(frame, filename)
+    pd.testing.assert_frame_equal(backend.read(filename), frame)
+
+
+def test_read_columns(tmp_path, backend):
+    filename = tmp_path / ("frame" + backend.extension)
+    backend.write(example_frame(), filename)
+    frame = backend.read(filename, columns=["c", "missing"])
+    pd.testing.assert_frame_equal(frame, example_frame()[["c"]])
+
+
+def test_save_and_load_outputs(tmp_path, backend):
+    outputs = {"frame": example_frame(), "value": 1.5, "values": [1, 2]}
+    manifest = storage.save_outputs(outputs, tmp_path, backend=backend)
+    for filename in storage.list_output_files(manifest):
+        assert (tmp_path / filename).is_file()
+    loaded = storage.load_outputs(manifest, tmp_path)
+    assert sorted(loaded) == ["frame", "value", "values"]
+    pd.testing.assert_frame_equal(loaded["frame"], outputs["frame"])
+    assert loaded["value"] == 1.5
+    assert loaded["values"] == [1, 2]
+
+
+def test_lazy_outputs(tmp_path, backend):
+    outputs = {"frame": example_frame(), "value": 1.5}
+    manifest = storage.save_outputs(outputs, tmp_path, backend=backend)
+    lazy = storage.LazyOutputs(manifest, tmp_path)
+    assert not lazy.is_loaded()
+    assert lazy["value"] == 1.5
+    pd.testing.assert_frame_equal(lazy["frame"], outputs["frame"])
+    lazy.release()
+    assert not lazy.is_loaded()
+    assert sorted(lazy) == ["frame", "value"]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        storage.get_backend("csv")
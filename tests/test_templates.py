@@ -0,0 +1,87 @@
+import pathlib
+import re
+import pandas as pd
+import pytest
+import dclab.core as core
+from dclab.core import templates
+from dclab.nodes.device.sentaurus import sde
+
+
+class FakePreprocessor(object):
+    # Replaces @name@ by its value and records what happened in events
+    def __init__(self):
+        self.events = list()
+
+    def get_dependencies_from_file(self, filename):
+        return re.findall(r"@(\w+)@", pathlib.Path(filename).read_text())
+
+    def preprocess_file(self, filename, parameter_dict, output_directory, suffix):
+        filename = pathlib.Path(filename)
+        text = re.sub(
+            r"@(\w+)@", lambda x: str(parameter_dict[x.group(1)]), filename.read_text()
+        )
+        output_filename = filename.stem + suffix + filename.suffix
+        (pathlib.Path(output_directory) / output_filename).write_text(text)
+        self.events.append("render")
+        return output_filename
+
+
+@pytest.fixture
+def preprocessor(monkeypatch):
+    fake = FakePreprocessor()
+    monkeypatch.setattr(templates, "preprocessor", fake)
+    templates.get_cache().clear()
+    yield fake
+    templates.get_cache().clear()
+
+
+def write_template(directory):
+    filename = directory / "cmd.txt"
+    filename.write_text("a = @a@")
+    return filename
+
+
+def test_render_batch(tmp_path, preprocessor):
+    filename = write_template(tmp_path)
+    parameter_dicts = [{"a": 1, "b": 1}, {"a": 1, "b": 2}, {"a": 2}, {"b": 3}]
+    directories = [tmp_path / "run_{}".format(i) for i in range(4)]
+    rendered = templates.render_batch(filename, parameter_dicts, directories, "_x")
+    # Each value of a is rendered once, rows without a are left to render
+    assert preprocessor.events == ["render", "render"]
+    assert rendered == ["cmd_x.txt", "cmd_x.txt", "cmd_x.txt", None]
+    contents = [(x / "cmd_x.txt").read_text() for x in directories[:3]]
+    assert contents == ["a = 1", "a = 1", "a = 2"]
+    assert not directories[3].exists()
+    # Rows rendered later reuse the batch
+    templates.render(filename, {"a": 2}, directories[0], "_x")
+    assert (directories[0] / "cmd_x.txt").read_text() == "a = 2"
+    assert preprocessor.events == ["render", "render"]
+
+
+class EchoSDE(sde.SDE):
+    # Runs are recorded next to the renders
+    events = list()
+
+    def run(self):
+        EchoSDE.events.append("run")
+        filename = pathlib.Path(self.sim_dir) / self.cmd_filename
+        self.node_output["command"] = filename.read_text()
+
+    def output(self):
+        return {"command": self.node_output["command"]}
+
+
+def test_simulation_renders_templates_before_rows(tmp_path, preprocessor):
+    EchoSDE.events = preprocessor.events
+    pd.DataFrame({"a": [1, 1, 2, 2], "b": [1, 2, 1, 1]}).to_csv(
+        tmp_path / "doe.csv", index=False
+    )
+    simulation = core.Simulation(doe_filename=str(tmp_path / "doe.csv"))
+    simulation.add_node(EchoSDE(write_template(tmp_path)))
+    simulation.run_simulation()
+    assert preprocessor.events == ["render", "render", "run", "run"]
+    commands = simulation.output_frame["command"].tolist()
+    assert commands == ["a = 1", "a = 1", "a = 2", "a = 2"]
+    for i in range(4):
+        command_file = tmp_path / "doe" / "run_{}".format(i) / "00_EchoSDE"
+        assert (command_file / "cmd_sde.txt").read_text() == commands[i]
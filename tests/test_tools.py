@@ -0,0 +1,158 @@
+import asyncio
+import pickle
+import subprocess
+import threading
+import pytest
+from dclab.core import tools
+
+
+def write_tool(directory, name, body):
+    # Stand-in for a Sentaurus tool, e.g. sprocess or sdevice
+    filename = directory / name
+    with open(filename, "w") as f:
+        f.write("#!/bin/sh\n" + body + "\n")
+    filename.chmod(0o755)
+    return str(filename)
+
+
+def count_concurrent(filename):
+    # Highest number of tool instances running at once from start/end events
+    running, maximum = 0, 0
+    with open(filename, "r") as f:
+        for line in f:
+            running += 1 if line.strip() == "start" else -1
+            maximum = max(maximum, running)
+    return maximum
+
+
+def run_in_threads(runner, tool, cwd, n_runs):
+    threads = [
+        threading.Thread(
+            target=runner.run,
+            args=(tool, [i], cwd),
+            kwargs={"log_prefix": "{}_{}".format(tool, i)},
+        )
+        for i in range(n_runs)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.fixture
+def default_runner():
+    runner = tools.get_runner()
+    yield runner
+    tools.set_runner(runner)
+
+
+def test_executable_override_and_logs(tmp_path):
+    executable = write_tool(
+        tmp_path, "fake_sdevice", 'echo "arguments $@"\necho "warning" >&2'
+    )
+    runner = tools.ToolRunner(executables={"sdevice": executable})
+    result = runner.run("sdevice", ["device.cmd", 1], cwd=tmp_path, log_prefix="dev")
+    assert result.returncode == 0
+    assert result.args == [executable, "device.cmd", "1"]
+    assert (tmp_path / "dev.out").read_text() == "arguments device.cmd 1\n"
+    assert (tmp_path / "dev.err").read_text() == "warning\n"
+
+
+def test_log_prefix_defaults_to_tool(tmp_path):
+    executable = write_tool(tmp_path, "fake_sprocess", "echo done")
+    runner = tools.ToolRunner(executables={"sprocess": executable})
+    runner.run("sprocess", [], cwd=tmp_path)
+    assert (tmp_path / "sprocess.out").read_text() == "done\n"
+    assert (tmp_path / "sprocess.err").read_text() == ""
+
+
+def test_return_code_is_passed_on(tmp_path):
+    executable = write_tool(tmp_path, "fake_sprocess", "exit 3")
+    runner = tools.ToolRunner(executables={"sprocess": executable})
+    assert runner.run("sprocess", [], cwd=tmp_path).returncode == 3
+
+
+def test_timeout_from_runner(tmp_path):
+    executable = write_tool(tmp_path, "fake_sprocess", "sleep 10")
+    runner = tools.ToolRunner(
+        timeouts={"sprocess": 0.2}, executables={"sprocess": executable}
+    )
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run("sprocess", [], cwd=tmp_path)
+
+
+def test_timeout_argument_overrides_runner(tmp_path):
+    executable = write_tool(tmp_path, "fake_sdevice", "sleep 0.5")
+    runner = tools.ToolRunner(
+        timeouts={"sdevice": 0.1}, executables={"sdevice": executable}
+    )
+    assert runner.run("sdevice", [], cwd=tmp_path, timeout=10).returncode == 0
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run("sdevice", [], cwd=tmp_path, timeout=0.1)
+
+
+def test_limit_per_tool(tmp_path):
+    events = tmp_path / "events"
+    body = "echo start >> {0}\nsleep 0.3\necho end >> {0}".format(events)
+    runner = tools.ToolRunner(
+        limits={"sdevice": 2},
+        executables={"sdevice": write_tool(tmp_path, "fake_sdevice", body)},
+    )
+    run_in_threads(runner, "sdevice", tmp_path, 6)
+    assert count_concurrent(events) == 2
+
+
+def test_tools_without_limit_run_concurrently(tmp_path):
+    events = tmp_path / "events"
+    body = "echo start >> {0}\nsleep 1\necho end >> {0}".format(events)
+    runner = tools.ToolRunner(
+        limits={"sdevice": 1},
+        executables={"sprocess": write_tool(tmp_path, "fake_sprocess", body)},
+    )
+    run_in_threads(runner, "sprocess", tmp_path, 4)
+    assert count_concurrent(events) > 1
+
+
+def test_configure_replaces_default_runner(tmp_path, default_runner):
+    executable = write_tool(tmp_path, "fake_sde", "echo sde")
+    tools.configure(executables={"sde": executable})
+    assert tools.get_runner() is not default_runner
+    tools.run_tool("sde", [], cwd=tmp_path)
+    assert (tmp_path / "sde.out").read_text() == "sde\n"
+
+
+def test_runner_is_picklable(tmp_path):
+    executable = write_tool(tmp_path, "fake_sdevice", "echo copy")
+    runner = tools.ToolRunner(
+        limits={"sdevice": 1},
+        timeouts={"sdevice": 5},
+        executables={"sdevice": executable},
+    )
+    runner.run("sdevice", [], cwd=tmp_path)
+    copied_runner = pickle.loads(pickle.dumps(runner))
+    assert copied_runner.limits == {"sdevice": 1}
+    assert copied_runner.timeouts == {"sdevice": 5}
+    copied_runner.run("sdevice", [], cwd=tmp_path, log_prefix="copy")
+    assert (tmp_path / "copy.out").read_text() == "copy\n"
+
+
+def test_run_async_respects_limit(tmp_path):
+    events = tmp_path / "events"
+    body = "echo start >> {0}\nsleep 0.2\necho end >> {0}".format(events)
+    runner = tools.ToolRunner(
+        limits={"sdevice": 1},
+        executables={"sdevice": write_tool(tmp_path, "fake_sdevice", body)},
+    )
+
+    async def run_all():
+        return await asyncio.gather(
+            *[
+                runner.run_async("sdevice", [i], tmp_path, log_prefix=str(i))
+                for i in range(3)
+            ]
+        )
+
+    results = asyncio.run(run_all())
+    assert [x.returncode for x in results] == [0, 0, 0]
+    assert count_concurrent(events) == 1